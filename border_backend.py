@@ -0,0 +1,268 @@
+"""
+Execution backends for the border tools.
+
+Frames can be processed sequentially in the calling process, on a thread
+pool or on a process pool. Threads start instantly and share the caller's
+memory, and Pillow releases the GIL while decoding, encoding and doing file
+I/O, so they suit I/O-bound work such as uncompressed frames. Processes cost
+startup time and memory per worker but scale CPU-heavy work (compressed
+encodes, Python-level parsing) past the GIL.
+
+Both APIs the tools use are covered: create_pool returns a
+multiprocessing.Pool-style object (imap_unordered), create_executor a
+concurrent.futures Executor (submit/map).
+
+Prefetcher and WriterPool move file reads and writes onto their own threads,
+connected to the compute stage by bounded queues, so storage latency overlaps
+with compute instead of idling the workers.
+"""
+
+import queue
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+
+BACKENDS = ('sequential', 'thread', 'process')
+
+def resolve_backend(backend, io_bound, num_workers):
+    """
+    Picks the execution backend for a run.
+
+    Args:
+        backend: 'auto' or one of BACKENDS
+        io_bound: True if the work is dominated by file I/O and GIL-free
+                  Pillow calls (only used for 'auto')
+        num_workers: Number of workers the run will use
+
+    Returns:
+        Tuple of (backend, reason) for reporting
+    """
+    if backend == 'auto':
+        if num_workers <= 1:
+            return 'sequential', 'single worker'
+        if io_bound:
+            return 'thread', 'I/O-bound frames'
+        return 'process', 'CPU-bound frames'
+
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}' (choose from auto, {', '.join(BACKENDS)})")
+    return backend, 'requested'
+
+class SequentialPool:
+    """
+    multiprocessing.Pool stand-in that runs every task in the calling process.
+    """
+
+    def __init__(self, initializer=None, initargs=()):
+        if initializer is not None:
+            initializer(*initargs)
+
+    def imap_unordered(self, func, iterable, chunksize=1):
+        return map(func, iterable)
+
+    def close(self):
+        pass
+
+    def join(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+class SequentialExecutor(Executor):
+    """
+    Executor that runs each submitted call immediately in the calling thread.
+    """
+
+    def submit(self, fn, /, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+def create_pool(backend, num_workers, initializer=None, initargs=()):
+    """
+    Creates a Pool-style worker pool for a resolved backend.
+
+    Args:
+        backend: One of BACKENDS
+        num_workers: Number of worker processes or threads
+        initializer: Called with initargs once per worker (once in total
+                     for 'sequential')
+        initargs: Arguments for initializer
+
+    Returns:
+        Context manager with imap_unordered(func, iterable, chunksize)
+    """
+    if backend == 'process':
+        return Pool(processes=num_workers, initializer=initializer, initargs=initargs)
+    if backend == 'thread':
+        return ThreadPool(processes=num_workers, initializer=initializer, initargs=initargs)
+    return SequentialPool(initializer, initargs)
+
+def create_executor(backend, max_workers):
+    """
+    Creates a concurrent.futures executor for a resolved backend.
+
+    Args:
+        backend: One of BACKENDS
+        max_workers: Number of worker processes or threads
+
+    Returns:
+        Executor (usable as a context manager)
+    """
+    if backend == 'process':
+        return ProcessPoolExecutor(max_workers=max_workers)
+    if backend == 'thread':
+        return ThreadPoolExecutor(max_workers=max_workers)
+    return SequentialExecutor()
+
+# Queue marker for a finished stage thread
+_DONE = object()
+
+class Prefetcher:
+    """
+    Reads job inputs ahead of the compute stage on background threads.
+
+    Jobs are pulled from a shared iterator, read with read_func and handed
+    over through a queue holding at most `depth` results. Iterating yields
+    (job, data) pairs in completion order; if reading fails, data is the
+    exception, so the compute stage raises it like any other frame error.
+    """
+
+    def __init__(self, jobs, read_func, threads, depth, stopped):
+        """
+        Args:
+            jobs: Iterable of jobs (consumed from the prefetch threads)
+            read_func: Function mapping a job to its input data
+            threads: Number of reader threads
+            depth: Maximum number of read results waiting to be consumed
+            stopped: threading.Event that aborts the readers and the iteration
+        """
+        self._jobs = iter(jobs)
+        self._read = read_func
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=max(depth, 1))
+        self._stopped = stopped
+        self._threads = [threading.Thread(target=self._run, daemon=True)
+                         for _ in range(max(threads, 1))]
+        for thread in self._threads:
+            thread.start()
+
+    def _put(self, item):
+        # Block while the queue is full, but give up once the run is stopped
+        while not self._stopped.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _run(self):
+        while True:
+            try:
+                with self._lock:
+                    job = next(self._jobs, _DONE)
+            except Exception as e:
+                self._put((None, e))
+                job = _DONE
+
+            if job is _DONE:
+                self._put(_DONE)
+                return
+
+            try:
+                data = self._read(job)
+            except Exception as e:
+                data = e
+            if not self._put((job, data)):
+                return
+
+    def __iter__(self):
+        remaining = len(self._threads)
+        while remaining:
+            try:
+                item = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                if self._stopped.is_set():
+                    return
+                continue
+            if item is _DONE:
+                remaining -= 1
+            else:
+                yield item
+
+    def join(self):
+        """Waits for the reader threads (set `stopped` first to abort them)."""
+        for thread in self._threads:
+            thread.join()
+
+class WriterPool:
+    """
+    Writes finished outputs on background threads.
+
+    put() blocks while `depth` outputs are queued, which throttles the
+    compute stage to the speed of the storage. The first write error is
+    raised from the next put() or from close().
+    """
+
+    def __init__(self, write_func, threads, depth):
+        """
+        Args:
+            write_func: Function called with the arguments given to put()
+            threads: Number of writer threads
+            depth: Maximum number of queued outputs
+        """
+        self._write = write_func
+        self._queue = queue.Queue(maxsize=max(depth, 1))
+        self._error = None
+        self._closed = False
+        self._threads = [threading.Thread(target=self._run, daemon=True)
+                         for _ in range(max(threads, 1))]
+        for thread in self._threads:
+            thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _DONE:
+                return
+            # After a failure the remaining outputs are drained, not written
+            if self._error is None:
+                try:
+                    self._write(*item)
+                except Exception as e:
+                    self._error = e
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
+
+    def put(self, *args):
+        """Queues one output for writing."""
+        self._raise_error()
+        self._queue.put(args)
+
+    def close(self, raise_error=True):
+        """
+        Writes all queued outputs and stops the writer threads.
+
+        Args:
+            raise_error: False to only shut down (e.g. while another error
+                         is already propagating)
+        """
+        if not self._closed:
+            self._closed = True
+            for _ in self._threads:
+                self._queue.put(_DONE)
+            for thread in self._threads:
+                thread.join()
+        if raise_error:
+            self._raise_error()
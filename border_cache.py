@@ -0,0 +1,458 @@
+"""
+Compiled sidecar cache for parsed border XML.
+
+Parsing border XML means converting millions of attribute strings or comma
+lists to integers on every run. The first run streams the XML once and
+writes the parsed values to a compact binary file next to it
+(<xml>.<kind>.bcache): one flat NumPy array of all frame data plus per-frame
+offsets. Later runs memory-map that file and skip the XML entirely.
+
+The cache is keyed by the XML's path, size, mtime and content hash and is
+rebuilt automatically when the XML changes. Builds are serialised with a
+lock file next to the cache (<cache>.lock), so when many processes start
+on a fresh XML at once (e.g. all shards of a render-farm job) one of them
+parses it and the others wait, then map the result.
+
+File layout:
+    [0:8)    magic b'BDRCACHE'
+    [8:16)   footer offset (uint64, little endian)
+    [16:24)  footer length (uint64, little endian)
+    [64:...) raw arrays, each aligned to 64 bytes
+    footer   JSON with the key and the dtype/shape/offset of every array
+"""
+
+import hashlib
+import json
+import os
+import socket
+import struct
+import tempfile
+import time
+from itertools import islice
+import numpy as np
+from border_xml import iter_frames, parse_frame_pixels
+
+CACHE_MAGIC = b'BDRCACHE'
+CACHE_VERSION = 1
+_ALIGN = 64
+
+# Seconds between checks while another process builds the cache, and
+# seconds without progress after which its lock is considered abandoned
+LOCK_POLL = 1.0
+LOCK_STALE = 120.0
+
+# Structured layout of one border pixel: (x, y, r, g, b)
+PIXEL_DTYPE = np.dtype([
+    ('x', np.int32), ('y', np.int32),
+    ('r', np.uint8), ('g', np.uint8), ('b', np.uint8),
+])
+
+class FrameCache:
+    """
+    Memory-mapped view of a compiled border cache.
+
+    Attributes:
+        path: Cache file the arrays are mapped from
+        frame_nums: Frame numbers of the cached frames, in document order
+        skipped: Frame numbers the parser rejected (e.g. missing tags)
+        data: Flat array holding every frame's values back to back
+        offsets: Start of each part in data, plus a final end offset
+        parts: Number of arrays stored per frame
+    """
+
+    def __init__(self, path, arrays, parts):
+        self.path = path
+        self.frame_nums = arrays['frame_nums']
+        self.skipped = arrays['skipped']
+        self.data = arrays['data']
+        self.offsets = arrays['offsets']
+        self.parts = parts
+
+    def __len__(self):
+        return len(self.frame_nums)
+
+    def frame(self, i):
+        """
+        Returns the arrays of the i-th cached frame as zero-copy views.
+
+        Args:
+            i: Position of the frame in the cache (not its frame number)
+
+        Returns:
+            List of `parts` arrays
+        """
+        start = i * self.parts
+        bounds = self.offsets[start:start + self.parts + 1]
+        return [self.data[bounds[p]:bounds[p + 1]] for p in range(self.parts)]
+
+    def index(self):
+        """
+        Maps frame numbers to cache positions (first occurrence wins).
+
+        Returns:
+            Dictionary of frame number -> position
+        """
+        positions = {}
+        for i, frame_num in enumerate(self.frame_nums.tolist()):
+            positions.setdefault(frame_num, i)
+        return positions
+
+def hash_file(path, chunk_size=1 << 20):
+    """
+    Computes the SHA-256 of a file without loading it into memory.
+
+    Args:
+        path: File to hash
+        chunk_size: Bytes read per iteration
+
+    Returns:
+        Hex digest string
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def cache_path_for(xml_path, kind):
+    """
+    Returns the sidecar cache path for an XML file.
+
+    Args:
+        xml_path: Path to the border XML
+        kind: Cache kind, e.g. 'pixels' or 'edges'
+    """
+    return f"{xml_path}.{kind}.bcache"
+
+def fallback_cache_path_for(xml_path, kind):
+    """
+    Returns the temp directory cache path used when the sidecar cannot be
+    written (e.g. a read-only XML share).
+
+    Args:
+        xml_path: Path to the border XML
+        kind: Cache kind, e.g. 'pixels' or 'edges'
+    """
+    name = hashlib.sha1(os.path.abspath(xml_path).encode()).hexdigest()
+    return os.path.join(tempfile.gettempdir(), f"border_{name}.{kind}.bcache")
+
+def open_frame_cache(xml_path, kind, parts):
+    """
+    Opens an up-to-date cache of an XML file without ever building one.
+
+    Lets a tool size its worker pool from the frame count before deciding
+    whether the XML has to be parsed at all.
+
+    Args:
+        xml_path: Path to the border XML
+        kind: Cache kind, e.g. 'pixels' or 'edges'
+        parts: Number of arrays per frame
+
+    Returns:
+        FrameCache, or None if there is no valid cache
+    """
+    # The sidecar wins; the temp directory holds the cache of XML files
+    # whose directory is not writable
+    for path in (cache_path_for(xml_path, kind), fallback_cache_path_for(xml_path, kind)):
+        arrays = _open_cache(path, xml_path, kind)
+        if arrays is not None:
+            return FrameCache(path, arrays, parts)
+    return None
+
+def load_frame_cache(xml_path, kind, extract_frame, parse_frame, dtype, parts,
+                     use_cache=True, map_func=map, batch_size=256):
+    """
+    Loads parsed frame data for an XML file, compiling the cache if needed.
+
+    Building the cache is split in two steps: extract_frame pulls the raw
+    payload out of each <frame> element while it is streamed (in this
+    process), and parse_frame turns payloads into arrays. parse_frame runs
+    through map_func in batches, so passing a process pool's map moves the
+    parsing off the main process.
+
+    Args:
+        xml_path: Path to the border XML
+        kind: Cache kind, stored in the file and used in the sidecar name
+        extract_frame: Function mapping a <frame> element to a picklable
+                       (frame_num, payload) tuple
+        parse_frame: Function mapping a payload to a sequence of `parts`
+                     arrays, or None to reject the frame
+        dtype: NumPy dtype of the per-frame arrays
+        parts: Number of arrays parse_frame returns per frame
+        use_cache: False to ignore any existing cache and rebuild it
+        map_func: Ordered map used for parse_frame (e.g. executor.map)
+        batch_size: Frames extracted before each map_func call
+
+    Returns:
+        FrameCache backed by a memory-mapped file
+    """
+    cache_path = cache_path_for(xml_path, kind)
+
+    if use_cache:
+        cache = open_frame_cache(xml_path, kind, parts)
+        if cache is not None:
+            return cache
+
+    build_args = (xml_path, kind, extract_frame, parse_frame, dtype, map_func, batch_size)
+    try:
+        cache = _locked_build(cache_path, build_args, parts, use_cache)
+    except OSError as e:
+        # Read-only XML directory: keep the cache in the temp directory instead
+        cache_path = fallback_cache_path_for(xml_path, kind)
+        print(f"Warning: cannot write cache next to XML ({e}), using {cache_path}")
+        cache = _locked_build(cache_path, build_args, parts, use_cache)
+
+    return cache
+
+def open_cache_data(cache_path):
+    """
+    Maps the flat data array of an already validated cache file.
+
+    Meant for worker processes: the parent validates the cache and passes
+    only its path, each worker maps it once and then slices frames out by
+    offset, so no frame data is pickled or copied between processes.
+
+    Args:
+        cache_path: Path of the cache file (FrameCache.path)
+
+    Returns:
+        Read-only flat data array backed by the file
+    """
+    return _open_cache(cache_path, None, None, validate=False)['data']
+
+def load_pixel_cache(xml_path, use_cache=True):
+    """
+    Loads a pixel-schema XML (<frame><pixel x y r g b/></frame>) as a FrameCache.
+
+    Args:
+        xml_path: Path to the border XML
+        use_cache: False to force a rebuild of the cache
+
+    Returns:
+        FrameCache with one PIXEL_DTYPE array per frame
+    """
+    return load_frame_cache(xml_path, 'pixels', _extract_pixel_frame,
+                            _parse_pixel_payload, PIXEL_DTYPE, 1, use_cache)
+
+def load_pixel_frames(xml_path, use_cache=True):
+    """
+    Loads a pixel-schema XML (<frame><pixel x y r g b/></frame>) via the cache.
+
+    Args:
+        xml_path: Path to the border XML
+        use_cache: False to force a rebuild of the cache
+
+    Returns:
+        Dictionary mapping frame numbers to PIXEL_DTYPE arrays (first
+        occurrence wins, like an XPath find)
+    """
+    cache = load_pixel_cache(xml_path, use_cache)
+    return {frame_num: cache.frame(i)[0] for frame_num, i in cache.index().items()}
+
+def _extract_pixel_frame(frame_elem):
+    return (int(frame_elem.get('number')), parse_frame_pixels(frame_elem))
+
+def _parse_pixel_payload(pixels):
+    return (np.array(pixels, dtype=PIXEL_DTYPE),)
+
+def _xml_key(xml_path, with_hash=True):
+    st = os.stat(xml_path)
+    key = {
+        'path': os.path.abspath(xml_path),
+        'size': st.st_size,
+        'mtime_ns': st.st_mtime_ns,
+    }
+    if with_hash:
+        key['sha256'] = hash_file(xml_path)
+    return key
+
+def _key_matches(stored, xml_path):
+    # Size must always match; identical path and mtime are trusted as-is,
+    # otherwise (touched, copied or moved files) the content hash decides
+    current = _xml_key(xml_path, with_hash=False)
+    if stored.get('size') != current['size']:
+        return False
+    if stored.get('path') == current['path'] and stored.get('mtime_ns') == current['mtime_ns']:
+        return True
+    return stored.get('sha256') == hash_file(xml_path)
+
+def _open_cache(cache_path, xml_path, kind, validate=True):
+    """Memory-maps a cache file; returns None if it is missing or stale."""
+    try:
+        with open(cache_path, 'rb') as f:
+            preamble = f.read(24)
+            if len(preamble) < 24 or preamble[:8] != CACHE_MAGIC:
+                return None
+            footer_offset, footer_len = struct.unpack('<QQ', preamble[8:24])
+            f.seek(footer_offset)
+            footer = json.loads(f.read(footer_len).decode('utf-8'))
+    except (OSError, ValueError):
+        return None
+
+    if footer.get('version') != CACHE_VERSION:
+        return None
+    if kind is not None and footer.get('kind') != kind:
+        return None
+    if validate and not _key_matches(footer.get('key', {}), xml_path):
+        return None
+
+    arrays = {}
+    for name, spec in footer['arrays'].items():
+        dtype = _descr_to_dtype(spec['descr'])
+        count = spec['shape'][0]
+        if count == 0:
+            arrays[name] = np.empty(0, dtype=dtype)
+            continue
+        # asarray drops the memmap subclass but keeps the mapping as buffer
+        arrays[name] = np.asarray(np.memmap(cache_path, dtype=dtype, mode='r',
+                                            offset=spec['offset'], shape=(count,)))
+    return arrays
+
+def _locked_build(cache_path, build_args, parts, reuse):
+    """Builds a cache while holding its lock file; returns the FrameCache."""
+    xml_path, kind = build_args[:2]
+    lock_path = f"{cache_path}.lock"
+    waited = False
+
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            pass
+
+        # Another process is building: wait for its cache, or take over
+        # once its lock is abandoned
+        if not waited:
+            print(f"Waiting for another process to build {cache_path}")
+            waited = True
+        time.sleep(LOCK_POLL)
+        if reuse:
+            arrays = _open_cache(cache_path, xml_path, kind)
+            if arrays is not None:
+                return FrameCache(cache_path, arrays, parts)
+        if _lock_is_stale(lock_path):
+            print(f"Removing abandoned cache lock {lock_path}")
+            try:
+                os.remove(lock_path)
+            except FileNotFoundError:
+                pass
+
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(f"{socket.gethostname()} {os.getpid()}\n")
+
+        # The previous lock holder may have finished just before we got in
+        arrays = _open_cache(cache_path, xml_path, kind) if reuse and waited else None
+        if arrays is None:
+            # Touching the lock on every batch shows waiters the build is alive
+            _build_cache(cache_path, *build_args, heartbeat=lambda: os.utime(lock_path))
+            arrays = _open_cache(cache_path, xml_path, kind, validate=False)
+        return FrameCache(cache_path, arrays, parts)
+    finally:
+        try:
+            os.remove(lock_path)
+        except FileNotFoundError:
+            pass
+
+def _lock_is_stale(lock_path):
+    """Checks whether a build lock's owner is gone (or silent too long)."""
+    try:
+        with open(lock_path, 'r', encoding='utf-8') as f:
+            host, pid = f.read().split()
+        age = time.time() - os.stat(lock_path).st_mtime
+    except FileNotFoundError:
+        return False
+    except (OSError, ValueError):
+        # Owner has not written its name yet (or the lock is garbage)
+        try:
+            return time.time() - os.stat(lock_path).st_mtime > LOCK_STALE
+        except FileNotFoundError:
+            return False
+
+    if host == socket.gethostname():
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return True
+        except (OSError, ValueError):
+            pass
+    return age > LOCK_STALE
+
+def _build_cache(cache_path, xml_path, kind, extract_frame, parse_frame, dtype,
+                 map_func, batch_size, heartbeat=None):
+    """Streams the XML once, writing frame data straight to the cache file."""
+    key = _xml_key(xml_path)
+    dtype = np.dtype(dtype)
+
+    frame_nums = []
+    skipped = []
+    offsets = [0]
+    specs = {}
+
+    tmp_path = f"{cache_path}.tmp{os.getpid()}"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(b'\0' * _ALIGN)
+
+            # Frame data goes to disk batch by batch as it is parsed, so
+            # memory stays bounded by one batch plus the small offset tables
+            data_offset = f.tell()
+            extracted = (extract_frame(elem) for elem in iter_frames(xml_path))
+            while True:
+                batch = list(islice(extracted, batch_size))
+                if not batch:
+                    break
+                if heartbeat is not None:
+                    heartbeat()
+
+                payloads = [payload for _, payload in batch]
+                for (frame_num, _), parsed in zip(batch, map_func(parse_frame, payloads)):
+                    if parsed is None:
+                        skipped.append(frame_num)
+                        continue
+
+                    frame_nums.append(frame_num)
+                    for values in parsed:
+                        values = np.ascontiguousarray(values, dtype=dtype)
+                        f.write(values.tobytes())
+                        offsets.append(offsets[-1] + len(values))
+
+            specs['data'] = (dtype, offsets[-1], data_offset)
+
+            for name, values in (('frame_nums', np.array(frame_nums, dtype=np.int64)),
+                                 ('skipped', np.array(skipped, dtype=np.int64)),
+                                 ('offsets', np.array(offsets, dtype=np.int64))):
+                f.write(b'\0' * (-f.tell() % _ALIGN))
+                specs[name] = (values.dtype, len(values), f.tell())
+                f.write(values.tobytes())
+
+            footer = json.dumps({
+                'version': CACHE_VERSION,
+                'kind': kind,
+                'key': key,
+                'arrays': {
+                    name: {
+                        'descr': np.lib.format.dtype_to_descr(spec_dtype),
+                        'shape': [count],
+                        'offset': offset,
+                    }
+                    for name, (spec_dtype, count, offset) in specs.items()
+                },
+            }).encode('utf-8')
+
+            footer_offset = f.tell()
+            f.write(footer)
+            f.seek(0)
+            f.write(CACHE_MAGIC + struct.pack('<QQ', footer_offset, len(footer)))
+
+        os.replace(tmp_path, cache_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def _descr_to_dtype(descr):
+    # JSON turns the descr tuples of structured dtypes into lists
+    if isinstance(descr, list):
+        descr = [tuple(field) for field in descr]
+    return np.lib.format.descr_to_dtype(descr)
@@ -0,0 +1,275 @@
+"""
+Border extraction: rendered frames back to packed border data.
+
+The reverse of pyborder2.create_frame_from_borders. Each frame of an image
+sequence is read, its four 1-pixel edges are sliced off (left and right
+columns and top and bottom rows, full length, so the corners appear in
+both) and packed into byte-shifted RGB values with
+pyborder2.pack_rgb_vectorized. The result is streamed, in frame order, into
+either the <left>/<right>/<top>/<bottom> XML schema or a border pack
+(see border_pack), whichever the output name asks for. Rendered corners
+belong to the left and right edges, so the ends of the extracted top and
+bottom rows repeat them; rendering the extracted data reproduces the frames.
+
+    python border_extract.py "renders/frame_####.png" borders.xml
+    python border_extract.py "renders/frame_####.png" borders.bpk
+
+Frames are read and packed in parallel on the usual backends, at most
+max_workers * tasks_per_worker at a time, and each frame's data is written
+out as soon as all earlier frames are, so memory stays constant however
+long the sequence. Headerless .rgb/.raw frames are memory-mapped and only
+their edges are read.
+"""
+
+import os
+import sys
+import time
+from collections import deque
+from itertools import islice
+
+import numpy as np
+from PIL import Image
+
+from border_backend import resolve_backend, create_executor
+from border_formats import NATIVE_MODES, RAW_EXTENSIONS, native_mode, raw_layout
+from border_journal import atomic_output
+from border_pack import PACK_EXTENSION, write_border_pack
+from border_sequence import discover_sequence, print_sequence_report
+from pyborder2 import pack_rgb_vectorized, print_progress_bar
+
+# Uncompressed inputs are I/O-bound (see border_backend.resolve_backend)
+UNCOMPRESSED_EXTENSIONS = RAW_EXTENSIONS + ('.tga', '.bmp')
+
+def edge_colors(edge, mode):
+    """
+    Converts one edge of a decoded frame to 8-bit RGB.
+
+    Args:
+        edge: NumPy array of shape (n[, channels]) in a NATIVE_MODES mode
+        mode: Pillow mode of the frame
+
+    Returns:
+        NumPy uint8 array of shape (n, 3); grayscale is spread over R, G, B
+        and 16-bit values are rounded to 8 bits
+    """
+    channels, _, scale = NATIVE_MODES[mode]
+    values = edge.reshape(len(edge), -1)[:, :channels]
+    if scale != 1:
+        values = (values.astype(np.uint32) + scale // 2) // scale
+    if channels == 1:
+        values = np.repeat(values, 3, axis=1)
+    return values.astype(np.uint8)
+
+def read_frame_edges(image_path, raw_size=None, pix_fmt='rgb24'):
+    """
+    Reads the four edges of a frame as 8-bit RGB.
+
+    Args:
+        image_path: Path to the frame
+        raw_size: (width, height) of headerless .rgb/.raw frames
+        pix_fmt: Pixel format of headerless frames (see RAW_PIXEL_FORMATS)
+
+    Returns:
+        Tuple of (left, right, top, bottom) uint8 arrays of shape (n, 3)
+    """
+    if os.path.splitext(image_path)[1].lower() in RAW_EXTENSIONS:
+        if not raw_size:
+            raise ValueError("headerless frames need raw_size=(width, height)")
+        width, height = raw_size
+        layout = raw_layout(width, height, pix_fmt)
+
+        # Map the file; only the pages holding the edges are read
+        frame = np.memmap(image_path, dtype=np.uint8, mode='r',
+                          shape=(height, width, layout['pixel_bytes']))
+        rgb = list(layout['channels'])
+        return tuple(np.array(edge[:, rgb]) for edge in
+                     (frame[:, 0], frame[:, -1], frame[0], frame[-1]))
+
+    # Pillow reduces 16-bit RGB(A) files to their high bytes, which is the
+    # 8-bit color the deep writers scaled up
+    with Image.open(image_path) as img:
+        img = native_mode(img)
+        frame = np.asarray(img)
+        mode = img.mode
+
+    return tuple(edge_colors(edge, mode) for edge in
+                 (frame[:, 0], frame[:, -1], frame[0], frame[-1]))
+
+def format_color_values(values):
+    """
+    Formats packed colors for the XML schema (the reverse of
+    pyborder2.parse_color_values).
+
+    Args:
+        values: NumPy array of packed RGB values
+
+    Returns:
+        Comma-separated string, e.g. "255,65280"
+    """
+    return ','.join(map(str, values.tolist()))
+
+def extract_frame_borders(image_path, raw_size=None, pix_fmt='rgb24', as_text=False):
+    """
+    Worker: extracts and packs the borders of one frame.
+
+    Args:
+        image_path: Path to the frame
+        raw_size: (width, height) of headerless .rgb/.raw frames
+        pix_fmt: Pixel format of headerless frames
+        as_text: Return the XML text of each edge instead of its array, so
+                 the formatting also runs on the workers
+
+    Returns:
+        Tuple of (left, right, top, bottom) packed RGB arrays (or strings)
+    """
+    edges = tuple(pack_rgb_vectorized(edge) for edge in read_frame_edges(image_path, raw_size, pix_fmt))
+    if as_text:
+        return tuple(format_color_values(edge) for edge in edges)
+    return edges
+
+def write_border_xml(path, frames):
+    """
+    Streams frames into the <left>/<right>/<top>/<bottom> XML schema
+    (atomically).
+
+    Args:
+        path: Output path
+        frames: Iterable of (frame_num, left, right, top, bottom) with the
+                comma-separated text of each edge
+
+    Returns:
+        Tuple of (frame count, file size in bytes)
+    """
+    count = 0
+    with atomic_output(path) as tmp_path:
+        with open(tmp_path, 'w', encoding='ascii') as f:
+            f.write('<frames>\n')
+            for frame_num, left, right, top, bottom in frames:
+                f.write(f'<frame number="{frame_num}"><left>{left}</left><right>{right}</right>'
+                        f'<top>{top}</top><bottom>{bottom}</bottom></frame>\n')
+                count += 1
+            f.write('</frames>\n')
+            size = f.tell()
+    return count, size
+
+def extract_sequence_borders(input_pattern, output_path, max_workers=None, tasks_per_worker=4,
+                             backend='auto', raw_size=None, pix_fmt='rgb24', output_format='auto',
+                             keyframe_interval=30, level=6, cache_listing=False):
+    """
+    Extracts the borders of an image sequence into border data.
+
+    Args:
+        input_pattern: Frame pattern, e.g. "renders/frame_####.png"
+                       (see border_sequence.discover_sequence)
+        output_path: XML or border pack file to write
+        max_workers: Number of parallel workers (None = CPU count)
+        tasks_per_worker: How many frames each worker may have queued; at
+                          most max_workers * tasks_per_worker frames are in
+                          flight (and held in memory) at once
+        backend: 'auto', 'sequential', 'thread' or 'process' (see
+                 border_backend); 'auto' uses threads for uncompressed frames
+        raw_size: (width, height) of headerless .rgb/.raw frames
+        pix_fmt: Pixel format of headerless frames (see RAW_PIXEL_FORMATS)
+        output_format: 'xml', 'pack', or 'auto' (a pack for a .bpk name)
+        keyframe_interval: Border pack keyframe interval (see write_border_pack)
+        level: Border pack zlib level
+        cache_listing: Reuse the cached directory listing of an earlier run
+
+    Returns:
+        Number of frames written
+    """
+    start_time = time.time()
+
+    if output_format == 'auto':
+        output_format = 'pack' if output_path.lower().endswith(PACK_EXTENSION) else 'xml'
+    if output_format not in ('xml', 'pack'):
+        raise ValueError(f"Unknown output format '{output_format}' (choose from auto, xml, pack)")
+
+    sequence = discover_sequence(input_pattern, cache_listing)
+    print_sequence_report(sequence)
+
+    # A repeated frame number keeps its first file, as readers of the data
+    # would keep its first entry anyway
+    frames = []
+    for frame_num, path in sequence['frames']:
+        if not frames or frames[-1][0] != frame_num:
+            frames.append((frame_num, path))
+
+    if not frames:
+        print(f"No frames match {input_pattern}")
+        return 0
+
+    # Process pools fork every worker up front, so never start more
+    # workers than there are frames
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = min(max_workers, len(frames))
+    io_bound = os.path.splitext(frames[0][1])[1].lower() in UNCOMPRESSED_EXTENSIONS
+    backend, reason = resolve_backend(backend, io_bound, max_workers)
+    if backend == 'sequential':
+        max_workers = 1
+    print(f"Extracting borders of {len(frames)} frame(s) to {output_path} ({output_format}); "
+          f"execution backend: {backend} ({reason})")
+
+    as_text = output_format == 'xml'
+    window = max_workers * max(tasks_per_worker, 1)
+    errors = []
+    completed = 0
+    read_bytes = 0
+
+    with create_executor(backend, max_workers) as executor:
+        def extracted_frames():
+            # Yield frames in sequence order while keeping the window full;
+            # the oldest frame is awaited first, so later frames finish in
+            # the background and nothing beyond the window is buffered
+            nonlocal completed, read_bytes
+            jobs = iter(frames)
+            pending = deque((frame_num, path, executor.submit(extract_frame_borders, path, raw_size,
+                                                              pix_fmt, as_text))
+                            for frame_num, path in islice(jobs, window))
+            while pending:
+                frame_num, path, future = pending.popleft()
+                for next_num, next_path in islice(jobs, 1):
+                    pending.append((next_num, next_path,
+                                    executor.submit(extract_frame_borders, next_path, raw_size,
+                                                    pix_fmt, as_text)))
+                try:
+                    edges = future.result()
+                    read_bytes += os.path.getsize(path)
+                except Exception as e:
+                    errors.append(f"Frame {frame_num}: {str(e)}")
+                    edges = None
+
+                completed += 1
+                print_progress_bar(completed, len(frames), start_time)
+                if edges is not None:
+                    yield (frame_num, *edges)
+
+        if output_format == 'pack':
+            count, size = write_border_pack(output_path, extracted_frames(), (),
+                                            keyframe_interval, level)
+        else:
+            count, size = write_border_xml(output_path, extracted_frames())
+
+    elapsed = max(time.time() - start_time, 1e-9)
+    print(f"\n\nWrote {count} frame(s) to {output_path} ({size} bytes) in {elapsed:.2f}s")
+    print(f"Throughput: {count / elapsed:.2f} frames/s, {read_bytes / elapsed / 1e6:.1f} MB/s read "
+          f"({backend} backend, {max_workers} worker(s))")
+
+    if errors:
+        print(f"\n{len(errors)} error(s) occurred (frames left out):")
+        for error in errors:
+            print(f"  - {error}")
+
+    return count
+
+def main(argv):
+    if len(argv) != 2:
+        print("Usage: python border_extract.py <frame pattern> <borders.xml | borders.bpk>")
+        return 2
+
+    extract_sequence_borders(argv[0], argv[1])
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
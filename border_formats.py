@@ -0,0 +1,327 @@
+"""
+Pixel layout probing and native-depth pixel handling for frame formats.
+
+For uncompressed formats (BMP, TGA, raw RGB) a pixel's bytes sit at a fixed,
+computable offset in the file, so border pixels can be patched in place
+through a memory map instead of decoding and re-encoding the whole frame.
+
+Decoded frames are patched in their own mode and bit depth: 8-bit border
+colors are scaled to the native range, alpha is left untouched and the frame
+is only converted when Pillow has no native mode the colors fit into.
+16-bit-per-channel RGB(A) files, which Pillow can only decode to 8 bits, are
+read and written through OpenCV when it is installed.
+"""
+
+import os
+import struct
+import numpy as np
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+# Extensions treated as headerless, tightly packed 8-bit RGB frames
+RAW_EXTENSIONS = ('.rgb', '.raw')
+
+# Packed 8-bit rawvideo pixel formats (ffmpeg -pix_fmt names):
+# format -> (byte index of (r, g, b) within a pixel, bytes per pixel)
+RAW_PIXEL_FORMATS = {
+    'rgb24': ((0, 1, 2), 3),
+    'bgr24': ((2, 1, 0), 3),
+    'rgba': ((0, 1, 2), 4),
+    'bgra': ((2, 1, 0), 4),
+    'argb': ((1, 2, 3), 4),
+    'abgr': ((3, 2, 1), 4),
+}
+
+# Pillow modes patched without conversion:
+# mode -> (color channels, alpha channel index or None, scale from 8-bit)
+# 'I' is how older Pillow versions decode 16-bit grayscale PNGs.
+NATIVE_MODES = {
+    'RGB': (3, None, 1),
+    'RGBA': (3, 3, 1),
+    'L': (1, None, 1),
+    'LA': (1, 1, 1),
+    'I;16': (1, None, 257),
+    'I;16L': (1, None, 257),
+    'I;16B': (1, None, 257),
+    'I': (1, None, 257),
+}
+
+# Scale from 8-bit colors to 16-bit channels (255 -> 65535)
+DEEP_SCALE = 257
+
+# Byte index of (r, g, b) in OpenCV's BGR(A) channel order
+DEEP_CHANNELS = (2, 1, 0)
+
+_warned_no_cv2 = False
+
+def probe_uncompressed_layout(path, raw_size=None, data=None):
+    """
+    Describes where each pixel lives in an uncompressed frame file.
+
+    Args:
+        path: Path to the frame file
+        raw_size: (width, height) of headerless raw RGB frames; without it
+                  .rgb/.raw files are not recognised
+        data: File contents if they have already been read; path then only
+              supplies the extension
+
+    Returns:
+        Layout dictionary, or None if the file cannot be patched in place:
+            width, height: Image size in pixels
+            offset: Byte offset of the first stored row
+            stride: Bytes per stored row (including padding)
+            pixel_bytes: Bytes per pixel
+            channels: Byte index of (r, g, b) within a pixel
+            bottom_up: True if the first stored row is the bottom image row
+            right_to_left: True if each row is stored right to left
+    """
+    ext = os.path.splitext(path)[1].lower()
+
+    try:
+        if ext == '.bmp':
+            layout = _probe_bmp(_read_header(path, 54, data))
+        elif ext == '.tga':
+            layout = _probe_tga(_read_header(path, 18, data))
+        elif ext in RAW_EXTENSIONS and raw_size:
+            layout = raw_layout(*raw_size)
+        else:
+            return None
+    except (OSError, struct.error):
+        return None
+
+    # Reject truncated files rather than writing past their end
+    size = len(data) if data is not None else os.path.getsize(path)
+    if layout is None or size < layout['offset'] + layout['stride'] * layout['height']:
+        return None
+
+    return layout
+
+def raw_layout(width, height, pix_fmt='rgb24'):
+    """
+    Describes a headerless, tightly packed rawvideo frame.
+
+    Args:
+        width, height: Frame size in pixels
+        pix_fmt: One of RAW_PIXEL_FORMATS
+
+    Returns:
+        Layout dictionary (see probe_uncompressed_layout)
+    """
+    try:
+        channels, pixel_bytes = RAW_PIXEL_FORMATS[pix_fmt]
+    except KeyError:
+        raise ValueError(f"Unsupported raw pixel format '{pix_fmt}' "
+                         f"(choose from {', '.join(RAW_PIXEL_FORMATS)})") from None
+
+    return {
+        'width': width, 'height': height,
+        'offset': 0, 'stride': width * pixel_bytes, 'pixel_bytes': pixel_bytes,
+        'channels': channels,
+        'bottom_up': False, 'right_to_left': False,
+    }
+
+def pixel_byte_offsets(layout, x, y):
+    """
+    Computes the file offset of the first byte of each (x, y) pixel.
+
+    Args:
+        layout: Layout from probe_uncompressed_layout
+        x, y: NumPy integer arrays of image coordinates (top-left origin)
+
+    Returns:
+        NumPy int64 array of byte offsets
+    """
+    rows = (layout['height'] - 1 - y) if layout['bottom_up'] else y
+    cols = (layout['width'] - 1 - x) if layout['right_to_left'] else x
+    return (layout['offset']
+            + rows.astype('int64') * layout['stride']
+            + cols.astype('int64') * layout['pixel_bytes'])
+
+def _read_header(path, size, data=None):
+    if data is not None:
+        return bytes(data[:size])
+    with open(path, 'rb') as f:
+        return f.read(size)
+
+def _probe_bmp(header):
+    if len(header) < 54 or header[:2] != b'BM':
+        return None
+
+    data_offset, = struct.unpack_from('<I', header, 10)
+    dib_size, width, height, planes, bpp, compression = struct.unpack_from('<IiiHHI', header, 14)
+
+    # Only plain BI_RGB 24/32-bit bitmaps have a fixed BGR(X) pixel layout
+    if dib_size < 40 or compression != 0 or bpp not in (24, 32) or width <= 0 or height == 0:
+        return None
+
+    return {
+        'width': width, 'height': abs(height),
+        'offset': data_offset,
+        'stride': ((bpp * width + 31) // 32) * 4,
+        'pixel_bytes': bpp // 8,
+        'channels': (2, 1, 0),
+        'bottom_up': height > 0,
+        'right_to_left': False,
+    }
+
+def _probe_tga(header):
+    if len(header) < 18:
+        return None
+
+    (id_length, colormap_type, image_type, _, colormap_length, colormap_depth,
+     _, _, width, height, bpp, descriptor) = struct.unpack('<BBBHHBHHHHBB', header)
+
+    # Type 2 is uncompressed true-color; RLE (type 10) cannot be patched in place
+    if image_type != 2 or bpp not in (24, 32) or width == 0 or height == 0:
+        return None
+
+    colormap_bytes = colormap_length * ((colormap_depth + 7) // 8) if colormap_type else 0
+
+    return {
+        'width': width, 'height': height,
+        'offset': 18 + id_length + colormap_bytes,
+        'stride': width * (bpp // 8),
+        'pixel_bytes': bpp // 8,
+        'channels': (2, 1, 0),
+        'bottom_up': not descriptor & 0x20,
+        'right_to_left': bool(descriptor & 0x10),
+    }
+
+def native_mode(img):
+    """
+    Returns the image in a mode border colors can be written to natively.
+
+    Modes in NATIVE_MODES are returned unchanged, so no conversion pass is
+    spent on them. Anything else (palette, CMYK, bilevel, ...) is expanded
+    to RGBA if it carries transparency and to RGB otherwise.
+
+    Args:
+        img: PIL Image
+
+    Returns:
+        PIL Image in one of the NATIVE_MODES
+    """
+    if img.mode in NATIVE_MODES:
+        return img
+    if img.mode in ('PA', 'La', 'RGBa') or 'transparency' in img.info:
+        return img.convert('RGBA')
+    return img.convert('RGB')
+
+def native_colors(mode, r, g, b):
+    """
+    Scales 8-bit border colors to a mode's native color channels.
+
+    Grayscale modes get the ITU-R 601-2 luma that Image.convert('L') uses,
+    computed after scaling so 16-bit targets keep their full precision.
+
+    Args:
+        mode: One of the NATIVE_MODES
+        r, g, b: NumPy arrays of 8-bit channel values
+
+    Returns:
+        NumPy int64 array of shape (n, color channels); alpha is not included
+    """
+    channels, _, scale = NATIVE_MODES[mode]
+    rgb = np.column_stack((r, g, b)).astype(np.int64) * scale
+    if channels == 1:
+        return (rgb @ np.array([19595, 38470, 7471]) + 0x8000)[:, np.newaxis] >> 16
+    return rgb
+
+def native_pixel(mode, r, g, b, current):
+    """
+    Builds the PixelAccess value of one border color in a native mode.
+
+    Args:
+        mode: One of the NATIVE_MODES
+        r, g, b: 8-bit channel values
+        current: Current PixelAccess value of the pixel (supplies alpha)
+
+    Returns:
+        Int for single-band modes, tuple otherwise
+    """
+    channels, alpha, scale = NATIVE_MODES[mode]
+    r, g, b = r * scale, g * scale, b * scale
+    if channels == 1:
+        color = ((r * 19595 + g * 38470 + b * 7471 + 0x8000) >> 16,)
+    else:
+        color = (r, g, b)
+    if alpha is not None:
+        color += (current[alpha],)
+    return color if len(color) > 1 else color[0]
+
+def is_deep_rgb(img):
+    """
+    Checks whether Pillow is decoding a 16-bit-per-channel RGB(A) file.
+
+    Pillow has no 16-bit color modes and silently reduces such files to
+    8-bit RGB/RGBA. Must be called before the image is loaded.
+
+    Args:
+        img: Freshly opened PIL Image
+
+    Returns:
+        True if the file stores 16 bits per color channel
+    """
+    for tile in img.tile:
+        rawmode = tile[3][0] if isinstance(tile[3], tuple) else tile[3]
+        if isinstance(rawmode, str) and rawmode.split(';')[0] in ('RGB', 'RGBA', 'RGBX') and ';16' in rawmode:
+            return True
+    return False
+
+def read_deep_frame(path, data=None):
+    """
+    Reads a 16-bit RGB(A) frame at full depth through OpenCV.
+
+    Args:
+        path: Path to a frame for which is_deep_rgb is True
+        data: File contents if they have already been read
+
+    Returns:
+        NumPy uint16 array (height, width, 3 or 4) in BGR(A) order, or None
+        if OpenCV is not installed or cannot read the file (the caller then
+        falls back to Pillow's 8-bit decode)
+    """
+    global _warned_no_cv2
+    if cv2 is None:
+        if not _warned_no_cv2:
+            print("Warning: OpenCV (cv2) is not installed, 16-bit RGB frames are written at 8 bits")
+            _warned_no_cv2 = True
+        return None
+
+    if data is not None:
+        frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+    else:
+        frame = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+    if frame is None or frame.dtype != np.uint16 or frame.ndim != 3:
+        return None
+    return frame
+
+def write_deep_frame(path, frame):
+    """
+    Writes a frame from read_deep_frame, keeping 16 bits per channel.
+
+    Args:
+        path: Output path (PNG or TIFF)
+        frame: NumPy uint16 BGR(A) array
+    """
+    if not cv2.imwrite(path, frame):
+        raise OSError(f"Could not write {path}")
+
+def encode_deep_frame(path, frame):
+    """
+    Encodes a frame from read_deep_frame in memory, keeping 16 bits per channel.
+
+    Args:
+        path: Output path; only its extension (PNG or TIFF) is used
+        frame: NumPy uint16 BGR(A) array
+
+    Returns:
+        Encoded file contents as bytes
+    """
+    ok, encoded = cv2.imencode(os.path.splitext(path)[1], frame)
+    if not ok:
+        raise OSError(f"Could not encode {path}")
+    return encoded.tobytes()
@@ -0,0 +1,125 @@
+"""
+Per-resolution border geometry shared by all frames of one size.
+
+Frame sizes almost never change inside a sequence, so the perimeter of each
+(width, height) is precomputed once per worker: the flat index of every
+perimeter pixel, and small row/column lookup tables that map any (x, y)
+straight to its position on the perimeter (or to a negative value when the
+pixel is outside the image or not on its border). Validating a frame's
+pixels is then a handful of table lookups instead of bounds and edge tests,
+and keeping the last entry per pixel is a scatter into a perimeter-sized
+array instead of a sort.
+
+Perimeter positions run along the top row, the bottom row, then the left
+and right columns without the corners, so each edge strip is one contiguous
+range of positions.
+"""
+
+from functools import lru_cache
+import numpy as np
+
+# Table value that keeps any sum with it negative (= not on the border)
+_OFF = -(1 << 40)
+
+class BorderGeometry:
+    """
+    Precomputed perimeter of one frame size.
+
+    Attributes:
+        width, height: Frame size in pixels
+        size: Number of perimeter pixels
+        flat: Flat index (y * width + x) of each perimeter position
+        strips: (start, stop) position ranges of the top, bottom, left and
+                right strips
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+
+        middle = np.arange(1, height - 1)
+        top = np.arange(width)
+        bottom = (height - 1) * width + top if height > 1 else top[:0]
+        left = middle * width
+        right = middle * width + width - 1 if width > 1 else left[:0]
+        self.flat = np.concatenate((top, bottom, left, right))
+        self.size = len(self.flat)
+
+        bounds = np.cumsum([0, len(top), len(bottom), len(left), len(right)])
+        self.strips = tuple(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+        # Tables are indexed by the coordinate clipped to -1..size, plus 1:
+        #   row_base: first position of an edge row (else negative)
+        #   row_side: offset of a middle row inside the side strips
+        #   col_x:    the column itself, if inside the image
+        #   col_side: first position of the left/right strip for those columns
+        self._row_base = np.full(height + 2, -1, dtype=np.int64)
+        self._row_side = np.full(height + 2, _OFF, dtype=np.int64)
+        self._col_x = np.full(width + 2, _OFF, dtype=np.int64)
+        self._col_side = np.full(width + 2, _OFF, dtype=np.int64)
+
+        self._row_base[1] = 0
+        if height > 1:
+            self._row_base[height] = width
+        self._row_side[middle + 1] = middle - 1
+        self._col_x[1:width + 1] = np.arange(width)
+        self._col_side[1] = bounds[2]
+        if width > 1:
+            self._col_side[width] = bounds[3]
+
+    def positions(self, x, y):
+        """
+        Maps pixel coordinates to perimeter positions.
+
+        Args:
+            x, y: NumPy integer arrays of image coordinates
+
+        Returns:
+            NumPy int64 array of perimeter positions, negative where (x, y)
+            is outside the image or not on its border
+        """
+        rows = np.clip(y, -1, self.height) + 1
+        cols = np.clip(x, -1, self.width) + 1
+        row_base = self._row_base[rows]
+        return np.where(row_base >= 0,
+                        row_base + self._col_x[cols],
+                        self._col_side[cols] + self._row_side[rows])
+
+    def select(self, pixels):
+        """
+        Validates a frame's pixels and keeps the last entry per border pixel.
+
+        Args:
+            pixels: PIXEL_DTYPE structured array
+
+        Returns:
+            Tuple of (pixels to write, ordered along the perimeter;
+            pixel_count of every valid entry, duplicates included)
+        """
+        positions = self.positions(pixels['x'], pixels['y'])
+        valid = np.flatnonzero(positions >= 0)
+
+        # Later entries overwrite earlier ones, like a sequential write. A
+        # plain scatter is exact when no pixel repeats, which is the usual
+        # case; otherwise the order-independent maximum.at decides
+        positions = positions[valid]
+        last = np.full(self.size, -1, dtype=np.intp)
+        last[positions] = valid
+        kept = np.flatnonzero(last >= 0)
+        if len(kept) != len(valid):
+            np.maximum.at(last, positions, valid)
+        return pixels[last[kept]], len(valid)
+
+@lru_cache(maxsize=16)
+def border_geometry(width, height):
+    """
+    Returns the shared BorderGeometry of a frame size (built on first use,
+    then reused by every frame of that size in this process).
+
+    Args:
+        width, height: Frame size in pixels
+
+    Returns:
+        BorderGeometry
+    """
+    return BorderGeometry(width, height)
@@ -0,0 +1,236 @@
+"""
+Crash-safe output writing and resumable runs for the border tools.
+
+Outputs are written to a hidden temporary file in the output directory and
+renamed over the final name once complete, so a killed run never leaves a
+truncated frame behind (at worst a stray .<name>.tmp<pid> file, which
+sequence discovery ignores like any other hidden file, and the next run
+over the same outputs removes).
+
+Every finished frame is appended to a journal (.border_journal in the
+output directory) as soon as its file is in place. A run started with
+resume=True skips the frames journaled by the interrupted run and carries on
+appending, so a preempted job only loses the frames that were in flight.
+Each shard of a sharded run (see border_shard) keeps its own journal.
+"""
+
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+
+from border_manifest import settings_digest
+
+JOURNAL_NAME = '.border_journal'
+JOURNAL_VERSION = 1
+
+# Name written by temp_path: .<stem>.tmp<pid><ext>
+_TEMP_NAME = re.compile(r'^\.(?P<stem>.*)\.tmp(?P<pid>\d+)(?P<ext>\.[^.]*)?$')
+
+def temp_path(path):
+    """
+    Returns the temporary name an output is written under.
+
+    The name is hidden, unique per process and keeps the extension, so
+    encoders that pick the format from the file name still work.
+
+    Args:
+        path: Final output path
+
+    Returns:
+        Temporary path in the same directory (rename stays atomic)
+    """
+    directory, name = os.path.split(path)
+    stem, ext = os.path.splitext(name)
+    return os.path.join(directory, f".{stem}.tmp{os.getpid()}{ext}")
+
+@contextmanager
+def atomic_output(path):
+    """
+    Context manager yielding a temporary path that replaces `path` on success.
+
+    os.replace swaps the directory entry, so a hardlink sharing the old
+    output's data (dedup) is never written through. If the block raises, the
+    temporary file is removed and `path` is left untouched.
+
+    Args:
+        path: Final output path
+    """
+    tmp_path = temp_path(path)
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.lexists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def remove_stale_temp_files(output_paths):
+    """
+    Removes the temporary files killed runs left behind for some outputs.
+
+    Only temporaries of the given outputs are touched, so a shard never
+    deletes the files another shard is writing into a shared directory;
+    this process's own temporaries are kept.
+
+    Args:
+        output_paths: Final output paths of the run
+
+    Returns:
+        Number of files removed
+    """
+    wanted = {}
+    for path in output_paths:
+        directory, name = os.path.split(path)
+        wanted.setdefault(directory, set()).add(name)
+
+    removed = 0
+    for directory, names in wanted.items():
+        try:
+            with os.scandir(directory or '.') as entries:
+                candidates = [entry.name for entry in entries if entry.name.startswith('.')]
+        except FileNotFoundError:
+            continue
+
+        for candidate in candidates:
+            match = _TEMP_NAME.match(candidate)
+            if (match is None or int(match.group('pid')) == os.getpid()
+                    or match.group('stem') + (match.group('ext') or '') not in names):
+                continue
+            try:
+                os.remove(os.path.join(directory, candidate))
+                removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
+
+class Journal:
+    """
+    Append-only record of the outputs a run has finished.
+
+    Each line is a JSON [key, entry] pair, where key is the output path
+    relative to the journal's directory and entry the manifest entry of the
+    output (or None). Lines are flushed as they are written, so they survive
+    the process being killed; a line torn by the kill is ignored on resume.
+    """
+
+    def __init__(self, output_dir, settings, resume=False, name=None, outputs=()):
+        """
+        Args:
+            output_dir: Directory holding the outputs and the journal
+                        (None = current directory)
+            settings: JSON-serialisable tool settings that affect the output;
+                      a journal written with other settings is not resumed
+            resume: Keep the journal of an earlier run and skip its frames
+                    (otherwise the journal is started afresh)
+            name: Shard label; the journal is then .border_journal.<name>
+            outputs: Output paths of the run; temporaries a killed run left
+                     for them are removed (see remove_stale_temp_files)
+        """
+        self.directory = output_dir or '.'
+        self.path = os.path.join(self.directory, JOURNAL_NAME if name is None
+                                 else f"{JOURNAL_NAME}.{name}")
+        self.settings = settings_digest(settings)
+        self.entries = self._load() if resume else None
+        self._lock = threading.Lock()
+
+        if self.entries is None:
+            self.entries = {}
+            self._file = open(self.path, 'w', encoding='utf-8')
+            self._write_line({'version': JOURNAL_VERSION, 'settings': self.settings})
+        else:
+            self._file = open(self.path, 'a', encoding='utf-8')
+            # Terminate a line torn by the interrupted run
+            if self._file.tell() and not self._ends_with_newline():
+                self._file.write('\n')
+
+        # Frames in flight when an earlier run was killed left hidden
+        # partial files; their outputs are rebuilt by this run
+        removed = remove_stale_temp_files(outputs)
+        if removed:
+            print(f"Removed {removed} partial file(s) left by an interrupted run")
+
+    def _load(self):
+        # Returns the finished outputs of the previous run, or None if there
+        # is no journal to resume
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                lines = f.read().split('\n')
+        except OSError:
+            print("No journal to resume from, starting from the first frame")
+            return None
+
+        try:
+            header = json.loads(lines[0])
+        except ValueError:
+            header = None
+        if (not isinstance(header, dict) or header.get('version') != JOURNAL_VERSION
+                or header.get('settings') != self.settings):
+            print("Journal was written with other settings, starting from the first frame")
+            return None
+
+        entries = {}
+        for line in lines[1:]:
+            try:
+                key, entry = json.loads(line)
+            except ValueError:
+                continue  # Empty or torn line
+            entries[key] = entry
+        return entries
+
+    def _ends_with_newline(self):
+        with open(self.path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b'\n'
+
+    def _write_line(self, value):
+        self._file.write(json.dumps(value) + '\n')
+        self._file.flush()
+
+    def _key(self, output_path):
+        return os.path.relpath(output_path, self.directory)
+
+    def is_done(self, output_path):
+        """
+        Checks whether the resumed run already finished an output.
+
+        Args:
+            output_path: Path of the output file
+
+        Returns:
+            True if the output was journaled and still exists
+        """
+        return self._key(output_path) in self.entries and os.path.exists(output_path)
+
+    def append(self, output_path, entry=None):
+        """
+        Journals a finished output. Call only after the file is in place.
+
+        Args:
+            output_path: Path of the output file
+            entry: Manifest entry of the output (see Manifest.record)
+        """
+        key = self._key(output_path)
+        with self._lock:
+            self.entries[key] = entry
+            self._write_line([key, entry])
+
+    def manifest_entries(self):
+        """
+        Returns the journaled manifest entries (for Manifest.restore), so an
+        interrupted run's frames are not lost from the manifest.
+        """
+        return {key: entry for key, entry in self.entries.items() if entry is not None}
+
+    def close(self):
+        """Closes the journal file."""
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
@@ -0,0 +1,205 @@
+"""
+Incremental rerun manifest for the border tools.
+
+Each run records a JSON manifest next to its output (.border_manifest.json)
+with one entry per output file: the signature (size, mtime) of the input
+image, a hash of the frame's border payload, a hash of the tool settings and
+the signature of the output as written. On an incremental rerun a frame is
+skipped when all of these still match, so fixing ten frames of a long
+sequence only rebuilds those ten.
+
+Shards of a run (see border_shard) share the output directory, so each
+saves its own .border_manifest.<shard>.json; every manifest file in the
+directory is read back, so reruns see all frames whatever the sharding.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+
+MANIFEST_NAME = '.border_manifest.json'
+MANIFEST_PATTERN = '.border_manifest*.json'
+MANIFEST_VERSION = 1
+
+def file_signature(path):
+    """
+    Returns a cheap change signature of a file.
+
+    Args:
+        path: File to stat
+
+    Returns:
+        [size, mtime_ns] list (JSON friendly)
+    """
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+def payload_digest(*payloads):
+    """
+    Hashes a frame's border payload.
+
+    Args:
+        *payloads: NumPy arrays, bytes, sequences of numbers/tuples, or
+                   None for a missing payload
+
+    Returns:
+        Hex digest string
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for payload in payloads:
+        if payload is None:
+            digest.update(b'\0')
+            continue
+        if not isinstance(payload, (bytes, bytearray)):
+            payload = np.ascontiguousarray(payload).tobytes()
+        # Length prefix keeps differently split payloads apart
+        digest.update(len(payload).to_bytes(8, 'little'))
+        digest.update(payload)
+    return digest.hexdigest()
+
+def settings_digest(settings):
+    """
+    Hashes tool settings that affect the output.
+
+    Args:
+        settings: JSON-serialisable settings dictionary
+
+    Returns:
+        Hex digest string
+    """
+    return hashlib.blake2b(json.dumps(settings, sort_keys=True, default=str).encode(),
+                           digest_size=16).hexdigest()
+
+class Manifest:
+    """
+    Per-output record of what each output file was built from.
+
+    Entries are keyed by the output path relative to the manifest's
+    directory. record() may be called from writer threads.
+    """
+
+    def __init__(self, output_dir, settings, name=None):
+        """
+        Args:
+            output_dir: Directory holding the outputs and the manifest
+                        (None = current directory)
+            settings: JSON-serialisable tool settings that affect the output
+            name: Shard label; the manifest is then saved as
+                  .border_manifest.<name>.json
+        """
+        self.directory = output_dir or '.'
+        self.path = os.path.join(self.directory, MANIFEST_NAME if name is None
+                                 else f".border_manifest.{name}.json")
+        self.settings = settings_digest(settings)
+        self.entries = {}
+        self._owned = set()  # Keys saved to this manifest's own file
+        self._load()
+        self._lock = threading.Lock()
+
+    def _load(self):
+        # Read every manifest file, oldest first so newer entries win
+        paths = glob.glob(os.path.join(glob.escape(self.directory), MANIFEST_PATTERN))
+        for path in sorted(paths, key=_mtime):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if data.get('version') != MANIFEST_VERSION:
+                continue
+            frames = data.get('frames', {})
+            self.entries.update(frames)
+            if os.path.abspath(path) == os.path.abspath(self.path):
+                self._owned.update(frames)
+
+    def _key(self, output_path):
+        return os.path.relpath(output_path, self.directory)
+
+    def is_current(self, output_path, input_signature, payload):
+        """
+        Checks whether an output is up to date.
+
+        Args:
+            output_path: Path of the output file
+            input_signature: file_signature of the input image (None if the
+                             tool has no input image)
+            payload: payload_digest of the frame's border data
+
+        Returns:
+            True if the output exists unchanged and was built from the same
+            input, payload and settings
+        """
+        entry = self.entries.get(self._key(output_path))
+        if (entry is None or entry.get('settings') != self.settings
+                or entry.get('payload') != payload or entry.get('input') != input_signature):
+            return False
+        try:
+            return file_signature(output_path) == entry.get('output')
+        except OSError:
+            return False
+
+    def record(self, output_path, input_signature, payload):
+        """
+        Records a freshly written output. Call only after the file is complete.
+
+        Args:
+            output_path: Path of the output file
+            input_signature: file_signature of the input image (or None)
+            payload: payload_digest of the frame's border data
+
+        Returns:
+            The recorded entry (JSON friendly)
+        """
+        entry = {
+            'input': input_signature,
+            'payload': payload,
+            'settings': self.settings,
+            'output': file_signature(output_path),
+        }
+        key = self._key(output_path)
+        with self._lock:
+            self.entries[key] = entry
+            self._owned.add(key)
+        return entry
+
+    def restore(self, entries):
+        """
+        Adds entries recorded by an interrupted run (see border_journal).
+
+        Args:
+            entries: Dictionary of manifest key -> entry
+        """
+        with self._lock:
+            self.entries.update(entries)
+            self._owned.update(entries)
+
+    def save(self):
+        """
+        Writes the manifest atomically (temp file + rename).
+
+        Only entries loaded from or recorded into this manifest's own file
+        are written; other shards' entries stay in their files.
+        """
+        with self._lock:
+            frames = {key: self.entries[key] for key in self._owned}
+            data = json.dumps({'version': MANIFEST_VERSION, 'frames': frames})
+
+        tmp_path = f"{self.path}.tmp{os.getpid()}"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Warning: cannot write manifest {self.path} ({e})")
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return 0
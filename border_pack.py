@@ -0,0 +1,282 @@
+"""
+Compact binary border format ("border pack", .bpk) for pyborder2.
+
+The comma-separated XML spends 8-10 bytes per border pixel, although most
+edges are runs of one color and consecutive frames are almost identical.
+A border pack stores each frame's four edges (left, right, top, bottom
+packed RGB values) as the smallest of:
+
+    raw     the uint32 values
+    rle     run-length encoded values
+    delta   run-length encoded XOR with the same edge of the previous
+            frame (unchanged pixels become long runs of zeros)
+
+and compresses each frame record with zlib when that helps. Every
+keyframe_interval-th frame is a keyframe that uses no deltas, and an index
+at the end of the file holds each frame's number, offset and keyframe, so
+any frame is found directly and decoded from at most keyframe_interval
+records.
+
+Layout (little-endian):
+    header   magic b'BPAK', version u16, reserved u16, frame count u64,
+             skipped count u64, index offset u64
+    records  per frame: flags u8 (bit 0 = zlib), then per edge
+             mode u8, length u32, runs u32, data
+    index    frame numbers i64[n], record offsets u64[n + 1],
+             keyframe positions u32[n], skipped frame numbers i64[s]
+
+Convert an XML file with pyborder2.convert_xml_to_border_pack, or
+
+    python border_pack.py frames.xml frames.bpk
+"""
+
+import mmap
+import struct
+import sys
+import zlib
+import numpy as np
+
+from border_journal import atomic_output
+
+PACK_MAGIC = b'BPAK'
+PACK_VERSION = 1
+PACK_EXTENSION = '.bpk'
+
+_HEADER = struct.Struct('<4sHHQQQ')
+_EDGE = struct.Struct('<BII')
+
+# Edge encodings
+_RAW, _RLE, _DELTA = 0, 1, 2
+
+# Record flags
+_ZLIB = 1
+
+EDGES = 4  # left, right, top, bottom
+
+def is_border_pack(path):
+    """
+    Checks whether a file is a border pack (by its magic, not its name).
+
+    Args:
+        path: File to check
+
+    Returns:
+        True for a border pack
+    """
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(PACK_MAGIC)) == PACK_MAGIC
+    except OSError:
+        return False
+
+def _runs(values):
+    # Run-length encode a 1D array into (lengths, values)
+    if not len(values):
+        return np.empty(0, '<u4'), np.empty(0, '<u4')
+    starts = np.flatnonzero(np.concatenate(([True], values[1:] != values[:-1])))
+    lengths = np.diff(np.append(starts, len(values)))
+    return lengths.astype('<u4'), values[starts].astype('<u4')
+
+def _encode_edge(values, previous):
+    # Smallest of raw, RLE and (with a same-length previous edge) delta
+    values = np.ascontiguousarray(values, dtype='<u4')
+    best = (_RAW, 0, values.tobytes())
+
+    lengths, run_values = _runs(values)
+    if 8 * len(lengths) < len(best[2]):
+        best = (_RLE, len(lengths), lengths.tobytes() + run_values.tobytes())
+
+    if previous is not None and len(previous) == len(values):
+        lengths, run_values = _runs(values ^ previous)
+        if 8 * len(lengths) < len(best[2]):
+            best = (_DELTA, len(lengths), lengths.tobytes() + run_values.tobytes())
+
+    mode, runs, data = best
+    return _EDGE.pack(mode, len(values), runs) + data
+
+def _decode_edges(record, previous):
+    # Decode one frame record into EDGES uint32 arrays
+    flags = record[0]
+    body = zlib.decompress(record[1:]) if flags & _ZLIB else bytes(record[1:])
+
+    edges = []
+    pos = 0
+    for e in range(EDGES):
+        mode, length, runs = _EDGE.unpack_from(body, pos)
+        pos += _EDGE.size
+        if mode == _RAW:
+            values = np.frombuffer(body, '<u4', length, pos)
+            pos += 4 * length
+        else:
+            lengths = np.frombuffer(body, '<u4', runs, pos)
+            run_values = np.frombuffer(body, '<u4', runs, pos + 4 * runs)
+            pos += 8 * runs
+            values = np.repeat(run_values, lengths)
+            if mode == _DELTA:
+                if previous is None or len(previous[e]) != length:
+                    raise ValueError("Border pack delta record without its previous frame")
+                values = values ^ previous[e]
+        edges.append(values.astype(np.uint32))
+    return edges
+
+def write_border_pack(path, frames, skipped=(), keyframe_interval=30, level=6):
+    """
+    Writes frames to a border pack (atomically).
+
+    Args:
+        path: Output path
+        frames: Iterable of (frame_num, left, right, top, bottom) with
+                packed RGB arrays, in the order they are to be stored
+        skipped: Frame numbers rejected while parsing (reported by readers)
+        keyframe_interval: Frames between self-contained keyframes; bounds
+                           how many records a random access decodes
+        level: zlib level for the frame records (0 = no compression)
+
+    Returns:
+        Tuple of (frame count, file size in bytes)
+    """
+    frame_nums = []
+    offsets = []
+    keyframes = []
+    previous = None
+    keyframe = 0
+
+    with atomic_output(path) as tmp_path:
+        with open(tmp_path, 'wb') as f:
+            f.write(b'\0' * _HEADER.size)
+
+            for i, (frame_num, *edges) in enumerate(frames):
+                if i % max(keyframe_interval, 1) == 0:
+                    keyframe = i
+                    previous = None
+
+                body = b''.join(_encode_edge(edge, None if previous is None else previous[e])
+                                for e, edge in enumerate(edges))
+                record = bytes([0]) + body
+                if level:
+                    packed = zlib.compress(body, level)
+                    if len(packed) < len(body):
+                        record = bytes([_ZLIB]) + packed
+
+                frame_nums.append(frame_num)
+                offsets.append(f.tell())
+                keyframes.append(keyframe)
+                f.write(record)
+                previous = [np.asarray(edge, dtype='<u4') for edge in edges]
+
+            index_offset = f.tell()
+            offsets.append(index_offset)
+            f.write(np.asarray(frame_nums, '<i8').tobytes())
+            f.write(np.asarray(offsets, '<u8').tobytes())
+            f.write(np.asarray(keyframes, '<u4').tobytes())
+            f.write(np.asarray(list(skipped), '<i8').tobytes())
+            size = f.tell()
+
+            f.seek(0)
+            f.write(_HEADER.pack(PACK_MAGIC, PACK_VERSION, 0, len(frame_nums),
+                                 len(skipped), index_offset))
+
+    return len(frame_nums), size
+
+class BorderPack:
+    """
+    Random-access reader for a border pack.
+
+    Offers the same interface as border_cache.FrameCache (frame_nums,
+    skipped, len(), frame(i), index()), so it can stand in for the compiled
+    XML cache. The file is memory-mapped. Reading frames in order decodes
+    each record once; any other access decodes from the frame's keyframe.
+    Not thread-safe.
+
+    Attributes:
+        path: Path of the pack
+        frame_nums: Frame numbers in stored order
+        skipped: Frame numbers rejected when the pack was written
+        offsets: Byte offset of each record, plus the index offset
+        keyframes: Position of the keyframe each frame is decoded from
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            magic, version, _, count, skipped, index_offset = _HEADER.unpack_from(self._map)
+        except struct.error:
+            raise ValueError(f"{path} is not a border pack") from None
+        if magic != PACK_MAGIC:
+            raise ValueError(f"{path} is not a border pack")
+        if version != PACK_VERSION:
+            raise ValueError(f"{path} is border pack version {version}, expected {PACK_VERSION}")
+
+        pos = index_offset
+        try:
+            self.frame_nums = np.frombuffer(self._map, '<i8', count, pos)
+            pos += 8 * count
+            self.offsets = np.frombuffer(self._map, '<u8', count + 1, pos)
+            pos += 8 * (count + 1)
+            self.keyframes = np.frombuffer(self._map, '<u4', count, pos)
+            pos += 4 * count
+            self.skipped = np.frombuffer(self._map, '<i8', skipped, pos)
+        except ValueError:
+            raise ValueError(f"{path} is a truncated border pack") from None
+
+        # Last decoded frame, for cheap sequential reads
+        self._last = None
+        self._last_edges = None
+
+    def __len__(self):
+        return len(self.frame_nums)
+
+    def _record(self, i):
+        return memoryview(self._map)[int(self.offsets[i]):int(self.offsets[i + 1])]
+
+    def frame(self, i):
+        """
+        Decodes the edges of the i-th stored frame.
+
+        Args:
+            i: Position of the frame in the pack (not its frame number)
+
+        Returns:
+            List of (left, right, top, bottom) uint32 arrays
+        """
+        start = int(self.keyframes[i])
+        if self._last is not None and start <= self._last < i:
+            start, edges = self._last + 1, self._last_edges
+        elif self._last == i:
+            return self._last_edges
+        else:
+            edges = None
+
+        for k in range(start, i + 1):
+            edges = _decode_edges(self._record(k), edges)
+
+        self._last, self._last_edges = i, edges
+        return edges
+
+    def index(self):
+        """
+        Maps frame numbers to pack positions (first occurrence wins).
+
+        Returns:
+            Dictionary of frame number -> position
+        """
+        positions = {}
+        for i, frame_num in enumerate(self.frame_nums.tolist()):
+            positions.setdefault(frame_num, i)
+        return positions
+
+def main(argv):
+    if len(argv) != 2:
+        print("Usage: python border_pack.py <frames.xml> <frames.bpk>")
+        return 2
+
+    # The XML schema (and its parser) belongs to pyborder2
+    from pyborder2 import convert_xml_to_border_pack
+    convert_xml_to_border_pack(argv[0], argv[1])
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
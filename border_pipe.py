@@ -0,0 +1,198 @@
+"""
+Raw-video pipe mode: applies border data to a stream of rawvideo frames.
+
+Fixed-size frames are read from stdin (or a file/FIFO), the border pixels of
+each frame index are written straight into the frame's bytes and the frame
+is passed on to stdout, so the tool can sit between two ffmpeg processes
+without any intermediate image files:
+
+    ffmpeg -i plate.mov -f rawvideo -pix_fmt rgb24 - \\
+        | python border_pipe.py borders.xml 1920x1080 \\
+        | ffmpeg -f rawvideo -pix_fmt rgb24 -s 1920x1080 -r 24 -i - out.mov
+
+Frame k of the stream gets the border data of frame number start_number + k;
+frames without border data pass through unchanged. A reader thread fills a
+small ring of frame buffers while the main thread patches and writes, so
+reading, patching and writing overlap. stdout carries the video, so all
+messages go to stderr.
+"""
+
+import argparse
+import contextlib
+import os
+import queue
+import sys
+import threading
+import time
+
+import numpy as np
+
+from border_cache import load_pixel_cache
+from border_formats import RAW_PIXEL_FORMATS, raw_layout
+from pyborderfast import patch_border_bytes
+
+def read_full(stream, buffer):
+    """
+    Fills a buffer from a stream, retrying short reads (pipes).
+
+    Args:
+        stream: Binary stream with readinto
+        buffer: Writable buffer to fill
+
+    Returns:
+        Number of bytes read (less than len(buffer) only at end of stream)
+    """
+    view = memoryview(buffer)
+    filled = 0
+    while filled < len(view):
+        count = stream.readinto(view[filled:])
+        if not count:
+            break
+        filled += count
+    return filled
+
+def _read_frames(source, buffers, free, filled, stopped):
+    # Reader thread: hands full buffers to the main thread, then None (end)
+    try:
+        while not stopped.is_set():
+            index = free.get()
+            count = read_full(source, buffers[index])
+            if count < len(buffers[index]):
+                if count:
+                    print(f"Warning: dropped a partial frame of {count} bytes at the end of the stream",
+                          file=sys.stderr)
+                break
+            filled.put(index)
+    except Exception as e:
+        filled.put(e)
+        return
+    filled.put(None)
+
+def process_raw_stream(xml_path, width, height, source=None, sink=None, pix_fmt='rgb24',
+                       start_number=0, buffers=4):
+    """
+    Applies border colors to every frame of a rawvideo stream.
+
+    Args:
+        xml_path: Path to XML file with sequence border data
+        width, height: Frame size in pixels
+        source: Input path (file or FIFO) or binary stream (None = stdin)
+        sink: Output path or binary stream (None = stdout)
+        pix_fmt: Packed pixel format of the stream (see RAW_PIXEL_FORMATS)
+        start_number: Frame number of the first frame in the stream
+        buffers: Frame buffers in flight between the reader and the writer
+
+    Returns:
+        Number of frames passed through
+    """
+    start_time = time.time()
+    layout = raw_layout(width, height, pix_fmt)
+    frame_size = layout['stride'] * height
+
+    # Border pixels come straight from the memory-mapped cache
+    cache = load_pixel_cache(xml_path)
+    frame_positions = cache.index()
+    print(f"Loaded data for {len(frame_positions)} frames; streaming {width}x{height} {pix_fmt} "
+          f"frames ({frame_size} bytes each)", file=sys.stderr)
+
+    own_source = isinstance(source, (str, bytes, os.PathLike))
+    own_sink = isinstance(sink, (str, bytes, os.PathLike))
+    # Frames are read straight into the ring buffers, so the input needs no
+    # buffering of its own (an unbuffered stream also lets the interpreter
+    # exit while the reader thread still waits on a stalled producer)
+    if source is None:
+        source = sys.stdin.buffer.raw
+    elif own_source:
+        source = open(source, 'rb', buffering=0)
+    if sink is None:
+        sink = sys.stdout.buffer
+    elif own_sink:
+        sink = open(sink, 'wb')
+
+    # Ring of frame buffers shared by the reader thread and this thread
+    ring = [bytearray(frame_size) for _ in range(max(buffers, 2))]
+    arrays = [np.frombuffer(buffer, dtype=np.uint8) for buffer in ring]
+    free = queue.Queue()
+    filled = queue.Queue()
+    for index in range(len(ring)):
+        free.put(index)
+
+    stopped = threading.Event()
+    reader = threading.Thread(target=_read_frames, args=(source, ring, free, filled, stopped),
+                              daemon=True)
+    reader.start()
+
+    frames = 0
+    total_pixels = 0
+    missing = 0
+    try:
+        while True:
+            index = filled.get()
+            if index is None:
+                break
+            if isinstance(index, Exception):
+                raise index
+
+            position = frame_positions.get(start_number + frames)
+            if position is None:
+                missing += 1
+            else:
+                pixels = cache.data[int(cache.offsets[position]):int(cache.offsets[position + 1])]
+                total_pixels += patch_border_bytes(arrays[index], pixels, layout)
+
+            sink.write(ring[index])
+            free.put(index)
+            frames += 1
+        sink.flush()
+    except BrokenPipeError:
+        # The consumer went away; stop quietly like other pipe filters
+        print(f"Output closed after {frames} frames", file=sys.stderr)
+    finally:
+        stopped.set()
+        free.put(0)  # Wake the reader if it waits for a buffer
+        if own_source:
+            source.close()
+        if own_sink:
+            sink.close()
+
+    elapsed = max(time.time() - start_time, 1e-9)
+    print(f"Streamed {frames} frames in {elapsed:.2f}s ({frames/elapsed:.2f} fps), "
+          f"{total_pixels} border pixels set", file=sys.stderr)
+    if missing:
+        print(f"Warning: {missing} frame(s) had no border data and passed through unchanged",
+              file=sys.stderr)
+
+    return frames
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply border data to a rawvideo stream "
+                                                 "(stdin to stdout by default).")
+    parser.add_argument('xml', help="border XML (pixel schema, see pyborderfast)")
+    parser.add_argument('size', help="frame size as WIDTHxHEIGHT, e.g. 1920x1080")
+    parser.add_argument('--pix-fmt', default='rgb24', choices=sorted(RAW_PIXEL_FORMATS),
+                        help="packed pixel format of the stream (default rgb24)")
+    parser.add_argument('--start-number', type=int, default=0,
+                        help="frame number of the first frame (default 0)")
+    parser.add_argument('-i', '--input', help="input file or FIFO (default stdin)")
+    parser.add_argument('-o', '--output', help="output file or FIFO (default stdout)")
+    args = parser.parse_args(argv)
+
+    try:
+        width, height = (int(v) for v in args.size.lower().split('x'))
+    except ValueError:
+        parser.error(f"invalid size '{args.size}' (expected WIDTHxHEIGHT)")
+
+    # Any stray print (e.g. a cache warning) must not end up in the video
+    sink = args.output or sys.stdout.buffer
+    with contextlib.redirect_stdout(sys.stderr):
+        process_raw_stream(args.xml, width, height, args.input, sink,
+                           args.pix_fmt, args.start_number)
+
+    # Python flushes stdout again at exit; after a broken pipe that would
+    # fail, so point it at /dev/null
+    if args.output is None:
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+
+if __name__ == "__main__":
+    main()
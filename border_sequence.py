@@ -0,0 +1,228 @@
+"""
+Image sequence discovery and frame-number mapping.
+
+A sequence is found with one os.scandir pass over its directory and one
+compiled regex per pattern, and every file is mapped to its frame number in
+a single pass. The file name part of a pattern holds the frame number (a
+glob directory part such as shots/*/ is expanded first and each matching
+directory scanned the same way); the frame number comes from:
+
+    ####    one '#' per digit of padding        (frame_####.png)
+    %04d    printf-style padding                (frame_%04d.png)
+    *       the last run of digits the wildcard matches
+            (shot12_frame_*.png: shot12_frame_0042.png is frame 42)
+
+Other glob syntax (?, [...]) is matched but never read as the frame number.
+Files without any digits get their position in the name-sorted listing.
+
+Listing huge directories over the network is slow, so the raw listing can
+be cached across runs in the temp directory, keyed by the directory's
+modification time (which changes whenever files are added, removed or
+renamed).
+"""
+
+import glob
+import hashlib
+import json
+import os
+import re
+import tempfile
+
+LISTING_CACHE_VERSION = 1
+
+# Frame tokens and glob syntax inside a file name pattern
+_TOKEN = re.compile(r'(#+|%0?\d*d|\*|\?|\[!?\]?[^\]]*\])')
+
+# Last run of digits in a name without a frame token or wildcard
+_LAST_DIGITS = re.compile(r'(\d+)\D*$')
+
+def compile_sequence_pattern(name_pattern):
+    """
+    Compiles a file name pattern into one regex.
+
+    The regex matches whole lines, so a newline-joined directory listing
+    can be searched with a single findall call; no part of it matches a
+    newline, so a match never spans two names. Like glob, names starting
+    with a dot only match patterns that start with one.
+
+    Args:
+        name_pattern: File name with a ####, %0Nd or * frame token
+
+    Returns:
+        Compiled regex with a 'name' group (the file name) and a 'frame'
+        group (the frame number digits, or None/absent when the name has no
+        digits where the number goes)
+    """
+    parts = _TOKEN.split(name_pattern)
+    tokens = parts[1::2]
+
+    # The frame number comes from the last explicit token, else the last '*'
+    frame_token = None
+    for i in range(len(tokens) - 1, -1, -1):
+        if tokens[i][0] in '#%':
+            frame_token = i
+            break
+    if frame_token is None and '*' in tokens:
+        frame_token = len(tokens) - 1 - tokens[::-1].index('*')
+
+    regex = []
+    for i, part in enumerate(parts):
+        if i % 2 == 0:
+            regex.append(re.escape(part))
+            continue
+
+        token = tokens[i // 2]
+        if i // 2 == frame_token:
+            if token == '*':
+                # Lazy prefix + digits + trailing non-digits: the last digit
+                # run inside the wildcard, or no digits at all
+                regex.append(r'(?:.*?(?P<frame>\d+)[^\d\n]*|[^\d\n]*)')
+            else:
+                regex.append(r'(?P<frame>-?\d+)')
+        elif token == '*':
+            regex.append('.*')
+        elif token == '?':
+            regex.append('.')
+        elif token[0] == '[':
+            regex.append('[' + ('^' + token[2:-1] + '\\n' if token[1] == '!' else token[1:-1]) + ']')
+        else:
+            regex.append(re.escape(token))
+
+    hidden = '' if name_pattern.startswith('.') else r'(?!\.)'
+    flags = re.IGNORECASE if os.name == 'nt' else 0
+    return re.compile(f"^(?P<name>{hidden}{''.join(regex)})$", flags | re.MULTILINE)
+
+def list_directory(directory, use_cache=False):
+    """
+    Lists the regular files of a directory with os.scandir.
+
+    Args:
+        directory: Directory to list
+        use_cache: Reuse the listing of an earlier run if the directory's
+                   modification time has not changed since
+
+    Returns:
+        List of file names (unsorted)
+    """
+    cache_path = None
+    if use_cache:
+        name = hashlib.sha1(os.path.abspath(directory).encode()).hexdigest()
+        cache_path = os.path.join(tempfile.gettempdir(), f"border_seq_{name}.json")
+        mtime_ns = os.stat(directory).st_mtime_ns
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            if cached.get('version') == LISTING_CACHE_VERSION and cached.get('mtime_ns') == mtime_ns:
+                return cached['names']
+        except (OSError, ValueError):
+            pass
+
+    with os.scandir(directory) as entries:
+        names = [entry.name for entry in entries if entry.is_file()]
+
+    # Only cache listings that cannot have changed while they were taken
+    if cache_path is not None and os.stat(directory).st_mtime_ns == mtime_ns:
+        tmp_path = f"{cache_path}.tmp{os.getpid()}"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': LISTING_CACHE_VERSION, 'mtime_ns': mtime_ns, 'names': names}, f)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f"Warning: cannot cache directory listing ({e})")
+
+    return names
+
+def discover_sequence(pattern, use_cache=False):
+    """
+    Finds the files of an image sequence and maps them to frame numbers.
+
+    Args:
+        pattern: Path pattern, e.g. "frames/frame_####.png",
+                 "frames/frame_%04d.png" or "frames/frame_*.png"; glob
+                 wildcards in the directory part ("shots/*/frame_*.png")
+                 scan every matching directory
+        use_cache: Reuse the directory listing of an earlier run when the
+                   directory is unchanged (see list_directory)
+
+    Returns:
+        Dictionary with:
+            frames: List of (frame_num, path) sorted by frame number
+            gaps: List of (first, last) missing frame ranges
+            duplicates: Dictionary of frame number -> paths sharing it
+    """
+    directory, name_pattern = os.path.split(pattern)
+    regex = compile_sequence_pattern(name_pattern)
+    has_frame = 'frame' in regex.groupindex
+
+    # Wildcards in the directory part expand like glob to every matching
+    # directory, each of which is then scanned on its own
+    if glob.has_magic(directory):
+        directories = sorted(path for path in glob.glob(directory) if os.path.isdir(path))
+    else:
+        directories = [directory]
+
+    # (path, frame digits) of every matching file
+    matches = []
+    for directory in directories:
+        prefix = os.path.join(directory, '')
+        matches.extend((prefix + name, digits)
+                       for name, digits in _match_directory(directory, regex, has_frame, use_cache))
+
+    # Names without digits (findall reports the missing group as '') keep
+    # their position in the name-sorted listing
+    positions = {}
+    if not all(digits for _, digits in matches):
+        positions = {path: index for index, path in enumerate(sorted(path for path, _ in matches))}
+
+    frames = sorted((int(digits) if digits else positions[path], path)
+                    for path, digits in matches)
+
+    # One pass over the sorted frames finds duplicate numbers and gaps
+    duplicates = {}
+    gaps = []
+    for (previous, previous_path), (frame_num, path) in zip(frames, frames[1:]):
+        if frame_num == previous:
+            duplicates.setdefault(frame_num, [previous_path]).append(path)
+        elif frame_num - previous > 1:
+            gaps.append((previous + 1, frame_num - 1))
+
+    return {'frames': frames, 'gaps': gaps, 'duplicates': duplicates}
+
+def _match_directory(directory, regex, has_frame, use_cache):
+    # (name, frame digits) of the files of one directory matching regex
+    try:
+        names = list_directory(directory or '.', use_cache)
+    except FileNotFoundError:
+        return []
+
+    # Match the whole listing in one pass (names containing a newline would
+    # break the line-based match and can never match a pattern anyway)
+    listing = '\n'.join(names)
+    if listing.count('\n') != len(names) - 1:
+        listing = '\n'.join(name for name in names if '\n' not in name)
+
+    if has_frame:
+        return regex.findall(listing)
+
+    # Literal name: the frame number is the name's last digit run
+    return [(match.group('name'), _last_digits(match.group('name')))
+            for match in regex.finditer(listing)]
+
+def _last_digits(name):
+    found = _LAST_DIGITS.search(os.path.splitext(name)[0])
+    return found.group(1) if found else None
+
+def print_sequence_report(sequence):
+    """
+    Prints warnings for missing and duplicated frame numbers.
+
+    Args:
+        sequence: Result of discover_sequence
+    """
+    for first, last in sequence['gaps']:
+        missing = f"{first}" if first == last else f"{first} to {last}"
+        print(f"Warning: frame(s) {missing} missing from the sequence")
+
+    for frame_num, paths in sequence['duplicates'].items():
+        names = ', '.join(os.path.basename(path) for path in paths)
+        print(f"Warning: frame {frame_num} appears {len(paths)} times ({names})")
@@ -0,0 +1,303 @@
+"""
+Frame-range sharding across machines and merging of per-shard run stats.
+
+A shard is selected either as 'i/N' (the i-th of N contiguous, equally
+sized slices of the sequence, counting from 0) or as explicit frame ranges
+("0-99,200-299"), or both (the ranges are then split N ways). Every node
+computes the same split from the same frame list, so shards never overlap
+and no coordination is needed. Each node only builds jobs for its own
+frames; the pixel data of the other frames in the mapped border cache is
+never touched. Shards started together on a fresh XML build its cache only
+once: the first takes the cache's lock file and the others wait for it
+(see border_cache), so the XML is parsed and hashed by a single node.
+
+Each sharded run writes a stats file (border_stats.<shard>.json) into the
+output directory. Merge them into one run report with
+
+    python border_shard.py <output_dir or stats files...>
+"""
+
+import glob
+import json
+import os
+import re
+import socket
+import sys
+import time
+import numpy as np
+
+from border_journal import atomic_output
+
+STATS_VERSION = 1
+STATS_PATTERN = 'border_stats.*.json'
+
+# Counters summed over shards by merge_shard_stats
+SUMMED_STATS = ('frames_total', 'frames_done', 'frames_skipped', 'pixels', 'unique', 'duplicates')
+
+_RANGE = re.compile(r'^\s*(-?\d+)\s*(?:-\s*(-?\d+)\s*)?$')
+
+def parse_shard(shard):
+    """
+    Parses a shard selector.
+
+    Args:
+        shard: 'i/N' string or (i, N) tuple, with 0 <= i < N (or None)
+
+    Returns:
+        (i, N) tuple, or None
+    """
+    if shard is None:
+        return None
+    if isinstance(shard, str):
+        try:
+            index, count = (int(part) for part in shard.split('/'))
+        except ValueError:
+            raise ValueError(f"Invalid shard '{shard}' (expected i/N, e.g. 0/4)") from None
+    else:
+        index, count = shard
+
+    if not 0 <= index < count:
+        raise ValueError(f"Invalid shard {index}/{count} (shards count from 0 to N-1)")
+    return index, count
+
+def parse_frame_ranges(frame_ranges):
+    """
+    Parses explicit frame ranges.
+
+    Args:
+        frame_ranges: String such as "0-99,200-299,350" or a list of
+                      (first, last) tuples, both inclusive (or None)
+
+    Returns:
+        List of (first, last) tuples, or None
+    """
+    if frame_ranges is None:
+        return None
+    if not isinstance(frame_ranges, str):
+        return [(int(first), int(last)) for first, last in frame_ranges]
+
+    ranges = []
+    for item in frame_ranges.split(','):
+        match = _RANGE.match(item)
+        if match is None:
+            raise ValueError(f"Invalid frame range '{item}' (expected first-last or a frame number)")
+        first = int(match.group(1))
+        last = int(match.group(2)) if match.group(2) is not None else first
+        ranges.append((first, last))
+    return ranges
+
+def shard_label(shard=None, frame_ranges=None):
+    """
+    Returns a file name friendly label for a shard.
+
+    Args:
+        shard: Result of parse_shard
+        frame_ranges: Result of parse_frame_ranges
+
+    Returns:
+        Label such as "shard0of4" or "frames0-99", or None when unsharded
+    """
+    parts = []
+    if frame_ranges:
+        parts.append('frames' + '_'.join(f"{first}-{last}" for first, last in frame_ranges))
+    if shard:
+        parts.append(f"shard{shard[0]}of{shard[1]}")
+    return '.'.join(parts) or None
+
+def select_shard(frame_nums, shard=None, frame_ranges=None):
+    """
+    Selects the positions of a shard's frames.
+
+    Args:
+        frame_nums: Frame numbers of the whole sequence, in a deterministic
+                    order (e.g. sorted, or XML document order)
+        shard: Result of parse_shard
+        frame_ranges: Result of parse_frame_ranges
+
+    Returns:
+        NumPy array of positions into frame_nums, in their original order
+    """
+    nums = np.asarray(frame_nums, dtype=np.int64)
+    mask = np.ones(len(nums), dtype=bool)
+    if frame_ranges:
+        mask = np.zeros(len(nums), dtype=bool)
+        for first, last in frame_ranges:
+            mask |= (nums >= first) & (nums <= last)
+
+    positions = np.flatnonzero(mask)
+    if shard:
+        index, count = shard
+        positions = positions[index * len(positions) // count:(index + 1) * len(positions) // count]
+    return positions
+
+def stats_path_for(output_dir, label):
+    """
+    Returns the default stats file path of a shard.
+
+    Args:
+        output_dir: Output directory of the run (None = current directory)
+        label: shard_label of the run
+
+    Returns:
+        Path of border_stats.<label>.json
+    """
+    return os.path.join(output_dir or '.', f"border_stats.{label}.json")
+
+def write_shard_stats(path, tool, shard, frame_ranges, started, **stats):
+    """
+    Writes the machine-readable stats of one run (atomically).
+
+    Args:
+        path: Stats file path
+        tool: Name of the tool that ran
+        shard: Result of parse_shard
+        frame_ranges: Result of parse_frame_ranges
+        started: Start timestamp (time.time()) of the run
+        **stats: Counters (see SUMMED_STATS), 'errors' list and any other
+                 JSON-serialisable details
+    """
+    finished = time.time()
+    data = {
+        'version': STATS_VERSION,
+        'tool': tool,
+        'shard': list(shard) if shard else None,
+        'frame_ranges': [list(r) for r in frame_ranges] if frame_ranges else None,
+        'host': socket.gethostname(),
+        'started': started,
+        'finished': finished,
+        'elapsed': finished - started,
+        **stats,
+    }
+    with atomic_output(path) as tmp_path:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+
+def load_shard_stats(paths):
+    """
+    Loads stats files, expanding directories to the stats files they hold.
+
+    Args:
+        paths: Stats file paths and/or output directories
+
+    Returns:
+        List of stats dictionaries (each with its 'path')
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, STATS_PATTERN))))
+        else:
+            files.append(path)
+
+    stats = []
+    for path in files:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != STATS_VERSION:
+            raise ValueError(f"{path} is not a version {STATS_VERSION} stats file")
+        data['path'] = path
+        stats.append(data)
+    return stats
+
+def merge_shard_stats(stats):
+    """
+    Combines per-shard stats into one run report.
+
+    Args:
+        stats: List of stats dictionaries (see load_shard_stats)
+
+    Returns:
+        Report dictionary with the summed counters, the wall-clock span of
+        all shards ('wall_time'), their summed run time ('node_time'), all
+        errors, and 'missing' / 'repeated' shard indices of i/N shards
+    """
+    report = {key: sum(s.get(key, 0) for s in stats) for key in SUMMED_STATS}
+    report['shards'] = len(stats)
+    report['tools'] = sorted({s['tool'] for s in stats})
+    report['hosts'] = sorted({s['host'] for s in stats})
+    report['errors'] = [error for s in stats for error in s.get('errors', [])]
+    report['node_time'] = sum(s['elapsed'] for s in stats)
+    report['wall_time'] = (max(s['finished'] for s in stats) - min(s['started'] for s in stats)
+                           if stats else 0.0)
+
+    # Check the i/N shards cover the run exactly once
+    counts = {s['shard'][1] for s in stats if s['shard']}
+    indices = [s['shard'][0] for s in stats if s['shard']]
+    report['shard_counts'] = sorted(counts)
+    report['missing'] = sorted(set(range(max(counts))) - set(indices)) if counts else []
+    report['repeated'] = sorted({i for i in indices if indices.count(i) > 1})
+    return report
+
+def print_run_report(report, stats):
+    """
+    Prints a merged run report.
+
+    Args:
+        report: Result of merge_shard_stats
+        stats: The stats it was merged from
+    """
+    print(f"{'='*60}")
+    print(f"Run report: {report['shards']} shard(s) of {', '.join(report['tools'])} "
+          f"on {len(report['hosts'])} host(s)")
+    print(f"{'='*60}")
+    for s in sorted(stats, key=lambda s: (s['shard'] or [-1])[0]):
+        name = f"{s['shard'][0]}/{s['shard'][1]}" if s['shard'] else '-'
+        print(f"  shard {name:>7} {s['host']:<20} {s['frames_done']:>8} done "
+              f"{s['frames_skipped']:>8} skipped {len(s.get('errors', [])):>5} errors "
+              f"{s['elapsed']:>9.2f}s")
+
+    print(f"Frames: {report['frames_total']} in shards, {report['frames_done']} processed, "
+          f"{report['frames_skipped']} skipped")
+    if report['pixels']:
+        print(f"Border pixels set: {report['pixels']}")
+    if report['unique'] or report['duplicates']:
+        print(f"Dedup: {report['unique']} unique, {report['duplicates']} duplicate(s)")
+    print(f"Wall time: {report['wall_time']:.2f}s, node time: {report['node_time']:.2f}s")
+    if report['wall_time'] > 0:
+        print(f"Frames per second (overall): {report['frames_done'] / report['wall_time']:.2f}")
+
+    if len(report['shard_counts']) > 1:
+        print(f"Warning: stats mix shard counts {report['shard_counts']}")
+    if report['missing']:
+        print(f"Warning: no stats for shard(s) {', '.join(map(str, report['missing']))}")
+    if report['repeated']:
+        print(f"Warning: several stats for shard(s) {', '.join(map(str, report['repeated']))}")
+
+    if report['errors']:
+        print(f"\n{len(report['errors'])} error(s) occurred:")
+        for error in report['errors']:
+            print(f"  - {error}")
+
+def merge_stats_command(argv):
+    """
+    Merge command: prints the run report of the given stats files/directories.
+
+    Args:
+        argv: Stats file paths and/or output directories; "-o report.json"
+              also writes the merged report as JSON
+
+    Returns:
+        Exit status (1 if there were no stats, shards are missing or any
+        shard had errors)
+    """
+    output = None
+    if '-o' in argv:
+        at = argv.index('-o')
+        output = argv[at + 1]
+        argv = argv[:at] + argv[at + 2:]
+
+    stats = load_shard_stats(argv or ['.'])
+    if not stats:
+        print("No stats files found")
+        return 1
+
+    report = merge_shard_stats(stats)
+    print_run_report(report, stats)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    return 1 if report['errors'] or report['missing'] else 0
+
+if __name__ == "__main__":
+    sys.exit(merge_stats_command(sys.argv[1:]))
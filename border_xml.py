@@ -0,0 +1,87 @@
+"""
+Shared XML helpers for the border tools (py_border, pyborderfast, pyborder2).
+
+Border XML files for long sequences can be several GB, so frames are read
+with iterparse and released as soon as they have been consumed.
+"""
+
+import xml.etree.ElementTree as ET
+
+def iter_frames(xml_path, tag='frame'):
+    """
+    Streams frame elements from a border XML file one at a time.
+
+    Each frame is yielded once its end tag has been read, then cleared and
+    detached from its parent, so peak memory is bounded by one frame rather
+    than the whole document.
+
+    Args:
+        xml_path: Path to XML file (or open file object)
+        tag: Tag of the elements to yield, at any depth (default: 'frame')
+
+    Yields:
+        Fully parsed frame elements in document order
+    """
+    # Stack of open elements, so a finished frame can be removed from its parent
+    open_elems = []
+
+    for event, elem in ET.iterparse(xml_path, events=('start', 'end')):
+        if event == 'start':
+            open_elems.append(elem)
+            continue
+
+        open_elems.pop()
+        if elem.tag != tag:
+            continue
+
+        yield elem
+
+        # Release the consumed frame and its children
+        elem.clear()
+        if open_elems:
+            open_elems[-1].remove(elem)
+
+def parse_frame_pixels(frame_elem):
+    """
+    Extracts the pixel list from one <frame> element.
+
+    Args:
+        frame_elem: <frame> element with <pixel x y r g b> children
+
+    Returns:
+        List of (x, y, r, g, b) integer tuples in document order
+    """
+    pixels = []
+
+    for pixel_elem in frame_elem.findall('pixel'):
+        x = int(pixel_elem.get('x'))
+        y = int(pixel_elem.get('y'))
+        r = int(pixel_elem.get('r'))
+        g = int(pixel_elem.get('g'))
+        b = int(pixel_elem.get('b'))
+        pixels.append((x, y, r, g, b))
+
+    return pixels
+
+def build_frame_index(xml_path):
+    """
+    Builds a frame-number index over a border XML file in a single pass.
+
+    Looking frames up in the index is O(1), instead of an XPath search over
+    the whole tree for every image.
+
+    Args:
+        xml_path: Path to XML file
+
+    Returns:
+        Dictionary mapping frame numbers to (x, y, r, g, b) pixel lists.
+        If a frame number repeats, the first occurrence wins (as with find).
+    """
+    frame_index = {}
+
+    for frame_elem in iter_frames(xml_path):
+        frame_num = int(frame_elem.get('number'))
+        if frame_num not in frame_index:
+            frame_index[frame_num] = parse_frame_pixels(frame_elem)
+
+    return frame_index
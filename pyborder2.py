@@ -1,357 +1,870 @@
-# “””
+"""
 XML Frame Generator Script
 
 This script reads an XML file containing frame definitions with border pixel colors,
 and generates PNG images for each frame with the specified border colors.
 
 The colors are stored as byte-shifted RGB values (e.g., 0xFF0000 for red).
-“””
+"""
 
 # Import required libraries
 
-import xml.etree.ElementTree as ET  # For parsing XML files
 from PIL import Image  # For creating and saving images
 import numpy as np  # For fast array operations
-from concurrent.futures import ProcessPoolExecutor, as_completed  # For parallel processing
+from concurrent.futures import wait, FIRST_COMPLETED  # For waiting on in-flight frames
+from itertools import islice  # For taking bounded batches of frames
 import time  # For timing and progress tracking
 import os  # For system information (CPU count)
+import hashlib  # For content hashes of duplicate frames
+import shutil  # For copying duplicate frames
+import threading  # For per-thread canvas templates
+from border_cache import load_frame_cache, open_frame_cache  # For the compiled XML sidecar cache
+from border_pack import BorderPack, is_border_pack, write_border_pack  # For compact binary border files
+from border_backend import resolve_backend, create_executor  # For sequential/thread/process execution
+from border_manifest import Manifest  # For incremental reruns
+from border_journal import Journal, atomic_output  # For crash-safe, resumable runs
+from border_shard import (parse_shard, parse_frame_ranges, shard_label, select_shard,
+                          stats_path_for, write_shard_stats)  # For render-farm sharding
+
+# Byte classes for the color list tokenizer: 0 = invalid, 1 = digit,
+# 2 = comma, 3 = the ASCII whitespace that str.strip() removes
+_BYTE_CLASS = np.zeros(256, dtype=np.uint8)
+_BYTE_CLASS[ord('0'):ord('9') + 1] = 1
+_BYTE_CLASS[ord(',')] = 2
+_BYTE_CLASS[[9, 10, 11, 12, 13, 32]] = 3
 
 def parse_color_values(color_string):
-“””
-Parse comma-separated color values from a string into a numpy array.
-
-```
-Args:
-    color_string: String containing comma-separated integer values (e.g., "255,65280,16711680")
-
-Returns:
-    NumPy array of unsigned 32-bit integers representing packed RGB colors
-
-Example:
-    "255,65280" -> np.array([255, 65280], dtype=np.uint32)
-"""
-# Split the string by commas, strip whitespace, convert to integers, and create numpy array
-return np.array([int(val.strip()) for val in color_string.split(',') if val.strip()], dtype=np.uint32)
-```
+    """
+    Parse comma-separated color values from a string into a numpy array.
+
+    The whole string is tokenized at once on its bytes instead of calling
+    int() per value: digit runs are located with array operations and then
+    converted column by column (one step per digit position, not per value).
+
+    Args:
+        color_string: String containing comma-separated integer values (e.g., "255,65280,16711680")
+
+    Returns:
+        NumPy array of unsigned 32-bit integers representing packed RGB colors
+
+    Raises:
+        ValueError: If a token is not a plain non-negative integer
+        OverflowError: If a value does not fit in 32 bits
+
+    Example:
+        "255,65280" -> np.array([255, 65280], dtype=np.uint32)
+    """
+    # View the text as raw bytes (non-ASCII text raises UnicodeEncodeError, a ValueError)
+    buf = np.frombuffer(color_string.encode('ascii'), dtype=np.uint8)
+
+    # Classify every byte; anything but digits, commas and whitespace is malformed
+    byte_class = _BYTE_CLASS.take(buf)
+    if not byte_class.all():
+        raise ValueError(f"Invalid character in color list: {color_string[:40]!r}")
+
+    # Digit runs start where the digit mask rises and end where it falls
+    is_digit = (byte_class == 1).view(np.int8)
+    edges = np.flatnonzero(np.diff(is_digit, prepend=np.int8(0), append=np.int8(0)))
+    starts = edges[0::2]
+    ends = edges[1::2]
+
+    # Empty or whitespace-only lists give an empty array
+    if len(starts) == 0:
+        return np.empty(0, dtype=np.uint32)
+
+    # A token may hold only one digit run ("12 34" is malformed, like int())
+    token_ids = np.searchsorted(np.flatnonzero(byte_class == 2), starts)
+    if np.any(token_ids[1:] == token_ids[:-1]):
+        raise ValueError(f"Malformed value in color list: {color_string[:40]!r}")
+
+    # Horner's rule across all runs at once, one digit position per step
+    lengths = ends - starts
+    values = np.zeros(len(starts), dtype=np.uint64)
+    last = len(buf) - 1
+    for j in range(int(lengths.max())):
+        digits = buf.take(np.minimum(starts + j, last)) - np.uint8(48)
+        values = np.where(j < lengths, values * 10 + digits, values)
+
+        # Values only grow, so checking each step also rules out uint64 wraparound
+        if values.max() > 0xFFFFFFFF:
+            raise OverflowError("Color value out of range for uint32")
+
+    return values.astype(np.uint32)
 
 def unpack_rgb_vectorized(packed_colors):
-“””
-Unpack byte-shifted RGB values into separate R, G, B channels using vectorized operations.
-
-```
-Byte-shifted RGB format stores colors as a single integer:
-- Red channel: bits 16-23 (0xFF0000)
-- Green channel: bits 8-15 (0x00FF00)
-- Blue channel: bits 0-7 (0x0000FF)
-
-Args:
-    packed_colors: NumPy array of packed RGB values (e.g., [16711680, 65280, 255])
-
-Returns:
-    NumPy array of shape (n, 3) with separate R, G, B values (0-255)
-
-Example:
-    [16711680] (red) -> [[255, 0, 0]]
-    [65280] (green) -> [[0, 255, 0]]
-"""
-# Extract red channel by shifting right 16 bits and masking with 0xFF
-r = (packed_colors >> 16) & 0xFF
-
-# Extract green channel by shifting right 8 bits and masking with 0xFF
-g = (packed_colors >> 8) & 0xFF
-
-# Extract blue channel by masking with 0xFF (no shift needed)
-b = packed_colors & 0xFF
-
-# Stack the three channels together along the last axis to create RGB tuples
-# Result shape: (n, 3) where n is the number of colors
-return np.stack([r, g, b], axis=-1).astype(np.uint8)
-```
-
-def create_frame_from_borders(frame_data):
-“””
-Create a PNG image frame with colored border pixels based on provided data.
-
-```
-Args:
-    frame_data: Tuple containing (frame_number, left_colors, right_colors, top_colors, bottom_colors)
-               - frame_number: Integer identifier for the frame
-               - left/right/top/bottom_colors: NumPy arrays of packed RGB values
-
-Returns:
-    Tuple of (frame_number, success_boolean, message_or_filename)
-    - On success: (frame_num, True, "frame_0001.png")
-    - On failure: (frame_num, False, "error message")
-"""
-# Unpack the frame data tuple into individual variables
-frame_num, left, right, top, bottom = frame_data
-
-# Calculate image dimensions based on border lengths
-# Width is determined by the number of pixels in the top border
-width = len(top)
-# Height is determined by the number of pixels in the left border
-height = len(left)
-
-# Validate that all borders have consistent dimensions
-# Right border must have same length as left (both are height)
-# Bottom border must have same length as top (both are width)
-if len(right) != height or len(bottom) != width:
-    # Return error if dimensions don't match
-    return (frame_num, False, f"Border dimensions don't match!")
-
-# Create a new image array filled with white (255, 255, 255) as background
-# Shape: (height, width, 3) where 3 represents RGB channels
-img_array = np.full((height, width, 3), 255, dtype=np.uint8)
-
-# Unpack all border colors from packed format to RGB using vectorized operations
-top_colors = unpack_rgb_vectorized(top)        # Convert top border colors
-bottom_colors = unpack_rgb_vectorized(bottom)  # Convert bottom border colors
-left_colors = unpack_rgb_vectorized(left)      # Convert left border colors
-right_colors = unpack_rgb_vectorized(right)    # Convert right border colors
-
-# Set border pixels using numpy array slicing (much faster than loops)
-img_array[0, :] = top_colors        # Set entire top row (first row, all columns)
-img_array[-1, :] = bottom_colors    # Set entire bottom row (last row, all columns)
-img_array[:, 0] = left_colors       # Set entire left column (all rows, first column)
-img_array[:, -1] = right_colors     # Set entire right column (all rows, last column)
-
-# Convert the numpy array to a PIL Image object
-# 'RGB' mode indicates a color image with red, green, and blue channels
-img = Image.fromarray(img_array, 'RGB')
-
-# Generate filename with zero-padded frame number (e.g., frame_0001.png)
-filename = f"frame_{frame_num:04d}.png"
-
-# Save the image to disk as PNG
-img.save(filename)
-
-# Return success status with the filename
-return (frame_num, True, filename)
-```
+    """
+    Unpack byte-shifted RGB values into separate R, G, B channels using vectorized operations.
+
+    Byte-shifted RGB format stores colors as a single integer:
+    - Red channel: bits 16-23 (0xFF0000)
+    - Green channel: bits 8-15 (0x00FF00)
+    - Blue channel: bits 0-7 (0x0000FF)
+
+    Args:
+        packed_colors: NumPy array of packed RGB values (e.g., [16711680, 65280, 255])
+
+    Returns:
+        NumPy array of shape (n, 3) with separate R, G, B values (0-255)
+
+    Example:
+        [16711680] (red) -> [[255, 0, 0]]
+        [65280] (green) -> [[0, 255, 0]]
+    """
+    # Extract red channel by shifting right 16 bits and masking with 0xFF
+    r = (packed_colors >> 16) & 0xFF
+
+    # Extract green channel by shifting right 8 bits and masking with 0xFF
+    g = (packed_colors >> 8) & 0xFF
+
+    # Extract blue channel by masking with 0xFF (no shift needed)
+    b = packed_colors & 0xFF
+
+    # Stack the three channels together along the last axis to create RGB tuples
+    # Result shape: (n, 3) where n is the number of colors
+    return np.stack([r, g, b], axis=-1).astype(np.uint8)
+
+def pack_rgb_vectorized(rgb_colors):
+    """
+    Pack separate R, G, B channels into byte-shifted RGB values (the reverse
+    of unpack_rgb_vectorized).
+
+    Args:
+        rgb_colors: NumPy array of shape (n, 3) with R, G, B values (0-255)
+
+    Returns:
+        NumPy array of unsigned 32-bit integers representing packed RGB colors
+
+    Example:
+        [[255, 0, 0]] (red) -> [16711680]
+        [[0, 255, 0]] (green) -> [65280]
+    """
+    # Widen first so the shifts cannot overflow the 8-bit channels
+    channels = np.asarray(rgb_colors).astype(np.uint32)
+
+    # Red goes to bits 16-23, green to bits 8-15 and blue stays in bits 0-7
+    return (channels[:, 0] << 16) | (channels[:, 1] << 8) | channels[:, 2]
+
+# Encoder profiles: file extension, Pillow format and save() parameters.
+# 'compress_type' is the zlib strategy (1 = filtered, 2 = Huffman only,
+# 3 = RLE, 4 = fixed); the 'npy' profile writes the raw RGB array instead.
+# 'io_bound' marks uncompressed profiles, which the 'auto' backend runs on threads.
+ENCODER_PROFILES = {
+    'png':       {'ext': 'png', 'format': 'PNG', 'params': {}},                          # Pillow defaults
+    'png-fast':  {'ext': 'png', 'format': 'PNG', 'params': {'compress_level': 1}},       # Fastest deflate
+    'png-rle':   {'ext': 'png', 'format': 'PNG', 'params': {'compress_level': 1, 'compress_type': 3}},
+    'png-small': {'ext': 'png', 'format': 'PNG', 'params': {'compress_level': 9, 'optimize': True}},
+    'png-store': {'ext': 'png', 'format': 'PNG', 'params': {'compress_level': 0}, 'io_bound': True},  # No compression
+    'tga':       {'ext': 'tga', 'format': 'TGA', 'params': {}, 'io_bound': True},       # Uncompressed TGA
+    'bmp':       {'ext': 'bmp', 'format': 'BMP', 'params': {}, 'io_bound': True},       # Uncompressed BMP
+    'npy':       {'ext': 'npy', 'format': None, 'params': {}, 'io_bound': True},        # Raw (H, W, 3) uint8
+}
+
+# Default output filename; {frame} is the frame number, {pad} the zero-padding
+# width and {ext} the encoder's file extension
+FILENAME_TEMPLATE = 'frame_{frame:0{pad}d}.{ext}'
+
+# Default output settings (see process_xml_file)
+DEFAULT_OUTPUT = {
+    'output_dir': None,                      # None = current working directory
+    'filename_template': FILENAME_TEMPLATE,
+    'pad': 4,
+    'encoder': 'png',
+}
+
+# XML bytes per parsing worker when the border cache has to be built
+PARSE_BYTES_PER_WORKER = 4 << 20
+
+def get_encoder_profile(encoder):
+    """
+    Look up an encoder profile by name (or pass a profile dict through).
+
+    Args:
+        encoder: Key of ENCODER_PROFILES, or a dict with 'ext', 'format', 'params'
+
+    Returns:
+        Encoder profile dictionary
+    """
+    if isinstance(encoder, dict):
+        return encoder
+
+    try:
+        return ENCODER_PROFILES[encoder]
+    except KeyError:
+        raise ValueError(f"Unknown encoder profile '{encoder}' "
+                         f"(choose from {', '.join(ENCODER_PROFILES)})") from None
+
+def save_frame(img, filename, encoder='png'):
+    """
+    Encode and write a frame image using an encoder profile.
+
+    The file is written under a temporary name and renamed into place, so
+    an interrupted run never leaves a truncated frame, and an existing
+    output (possibly a hardlink shared with other frames) is replaced
+    rather than overwritten in place.
+
+    Args:
+        img: PIL Image to save
+        filename: Output path
+        encoder: Encoder profile name or dict (see ENCODER_PROFILES)
+    """
+    profile = get_encoder_profile(encoder)
+
+    with atomic_output(filename) as tmp_filename:
+        # Raw mode: dump the pixel array without any image container
+        if profile['format'] is None:
+            with open(tmp_filename, 'wb') as f:
+                np.save(f, np.asarray(img))
+        else:
+            img.save(tmp_filename, format=profile['format'], **profile['params'])
+
+# Per-thread cache of white template canvases, keyed by (width, height)
+_canvas_templates = threading.local()
+
+def get_canvas_template(width, height):
+    """
+    Return the calling worker's reusable white canvas for a frame size.
+
+    Allocating and filling a new canvas per frame dominated small frames,
+    so each worker (thread or process) keeps one PIL image per size and
+    only its edges are rewritten.
+
+    Args:
+        width: Canvas width in pixels
+        height: Canvas height in pixels
+
+    Returns:
+        PIL Image in 'RGB' mode, white apart from the last frame's edges
+    """
+    # Each thread gets its own dictionary so canvases are never shared
+    templates = getattr(_canvas_templates, 'by_size', None)
+    if templates is None:
+        templates = _canvas_templates.by_size = {}
+
+    # Create the template on first use of this size
+    canvas = templates.get((width, height))
+    if canvas is None:
+        canvas = templates[(width, height)] = Image.new('RGB', (width, height), (255, 255, 255))
+
+    return canvas
+
+def create_frame_from_borders(frame_data, output=None):
+    """
+    Create an image frame with colored border pixels based on provided data.
+
+    Args:
+        frame_data: Tuple containing (frame_number, left_colors, right_colors, top_colors, bottom_colors)
+                   - frame_number: Integer identifier for the frame
+                   - left/right/top/bottom_colors: NumPy arrays of packed RGB values
+        output: Output settings dictionary (see DEFAULT_OUTPUT); None = defaults
+
+    Returns:
+        Tuple of (frame_number, success_boolean, message_or_filename)
+        - On success: (frame_num, True, "frame_0001.png")
+        - On failure: (frame_num, False, "error message")
+    """
+    # Unpack the frame data tuple into individual variables
+    frame_num, left, right, top, bottom = frame_data
+
+    # Calculate image dimensions based on border lengths
+    # Width is determined by the number of pixels in the top border
+    width = len(top)
+    # Height is determined by the number of pixels in the left border
+    height = len(left)
+
+    # Validate that all borders have consistent dimensions
+    # Right border must have same length as left (both are height)
+    # Bottom border must have same length as top (both are width)
+    if len(right) != height or len(bottom) != width:
+        # Return error if dimensions don't match
+        return (frame_num, False, f"Border dimensions don't match!")
+
+    # Reuse this worker's white canvas for the frame size. Every frame
+    # overwrites the full perimeter and never touches the interior, so the
+    # canvas never needs clearing between frames
+    img = get_canvas_template(width, height)
+
+    # Unpack all border colors from packed format to RGB using vectorized operations
+    top_colors = unpack_rgb_vectorized(top)        # Convert top border colors
+    bottom_colors = unpack_rgb_vectorized(bottom)  # Convert bottom border colors
+    left_colors = unpack_rgb_vectorized(left)      # Convert left border colors
+    right_colors = unpack_rgb_vectorized(right)    # Convert right border colors
+
+    # Paste the four 1-pixel edge strips; left and right go last so they
+    # own the corners (same order as filling rows, then columns)
+    img.paste(Image.fromarray(top_colors[np.newaxis]), (0, 0))                  # Entire top row
+    img.paste(Image.fromarray(bottom_colors[np.newaxis]), (0, height - 1))      # Entire bottom row
+    img.paste(Image.fromarray(left_colors[:, np.newaxis]), (0, 0))              # Entire left column
+    img.paste(Image.fromarray(right_colors[:, np.newaxis]), (width - 1, 0))     # Entire right column
+
+    # Generate filename with zero-padded frame number (e.g., frame_0001.png)
+    output = output or DEFAULT_OUTPUT
+    filename = frame_filename(frame_num, output)
+
+    # Encode and save the image with the selected encoder profile (this
+    # replaces any previous output, including a hardlink from dedup)
+    save_frame(img, filename, output['encoder'])
+
+    # Return success status with the filename
+    return (frame_num, True, filename)
+
+def frame_filename(frame_num, output=None):
+    """
+    Build the output path for a frame number.
+
+    Args:
+        frame_num: Integer identifier for the frame
+        output: Output settings dictionary (see DEFAULT_OUTPUT); None = defaults
+
+    Returns:
+        Output path (e.g., "frame_0001.png" with the default settings)
+    """
+    output = output or DEFAULT_OUTPUT
+    ext = get_encoder_profile(output['encoder'])['ext']
+    name = output['filename_template'].format(frame=frame_num, pad=output['pad'], ext=ext)
+    return os.path.join(output['output_dir'] or '', name)
+
+def hash_frame_borders(left, right, top, bottom):
+    """
+    Compute a content hash identifying a frame's rendered output.
+
+    Two frames with the same digest produce identical images, because the
+    dimensions and every border color go into the hash.
+
+    Args:
+        left, right, top, bottom: NumPy arrays of packed RGB values
+
+    Returns:
+        Bytes digest of the dimensions plus the four border arrays
+    """
+    digest = hashlib.blake2b(digest_size=16)
+
+    # Include the edge lengths so differently sized frames never collide
+    digest.update(np.array([len(left), len(right), len(top), len(bottom)], dtype=np.int64).tobytes())
+
+    # Hash the raw color bytes of each border
+    for border in (left, right, top, bottom):
+        digest.update(np.ascontiguousarray(border, dtype=np.uint32).tobytes())
+
+    return digest.digest()
+
+def link_or_copy(src, dst, mode='link'):
+    """
+    Reproduce an already written frame file under a new name.
+
+    Args:
+        src: Existing output file of the original frame
+        dst: Filename of the duplicate frame
+        mode: 'link' to hardlink (falling back to a copy where the filesystem
+              does not support it) or 'copy' to always write a full copy
+    """
+    # Build the file under a temporary name and rename it over any output
+    # left over from a previous run
+    with atomic_output(dst) as tmp_dst:
+        if mode == 'link':
+            try:
+                os.link(src, tmp_dst)
+                return
+            except OSError:
+                pass  # e.g. FAT/exFAT or network shares without hardlinks
+
+        # shutil.copyfile uses the fastest kernel copy the platform offers
+        shutil.copyfile(src, tmp_dst)
+
+def extract_frame_text(frame):
+    """
+    Extract the raw border text from a single XML frame element.
+
+    This only reads element text, so it is cheap enough for the main
+    process; the expensive number parsing happens in parse_border_texts.
+
+    Args:
+        frame: XML element containing frame data with 'number' attribute and
+               child elements: <left>, <right>, <top>, <bottom>
+
+    Returns:
+        Tuple of (frame_number, (left_text, right_text, top_text, bottom_text))
+        Each text is None if its element is missing
+    """
+    # Get the frame number from the 'number' attribute, default to 0 if not found
+    frame_num = int(frame.get('number', 0))
+
+    # Find all required border elements in the XML
+    texts = []
+    for tag in ('left', 'right', 'top', 'bottom'):
+        elem = frame.find(tag)
+        # The 'or' clause handles cases where element.text might be None
+        texts.append(None if elem is None else (elem.text or ''))
+
+    return (frame_num, tuple(texts))
+
+def parse_border_texts(texts):
+    """
+    Parse the four raw border texts of a frame into packed color arrays.
+
+    Runs in the worker processes when the border cache is built.
+
+    Args:
+        texts: Tuple of (left_text, right_text, top_text, bottom_text)
+
+    Returns:
+        Tuple of (left_array, right_array, top_array, bottom_array)
+        Returns None if any border element was missing
+    """
+    # Check if all required elements are present
+    if any(text is None for text in texts):
+        # Return None if any element is missing
+        return None
+
+    # Parse the color values from each element's text content
+    return tuple(parse_color_values(text) for text in texts)
 
 def parse_frame_data(frame):
-“””
-Extract and parse data from a single XML frame element.
-
-```
-Args:
-    frame: XML element containing frame data with 'number' attribute and
-           child elements: <left>, <right>, <top>, <bottom>
-
-Returns:
-    Tuple of (frame_number, left_array, right_array, top_array, bottom_array)
-    Returns None if the frame is missing required elements
-"""
-# Get the frame number from the 'number' attribute, default to 0 if not found
-frame_num = int(frame.get('number', 0))
-
-# Find all required border elements in the XML
-left_elem = frame.find('left')      # Find <left> tag
-right_elem = frame.find('right')    # Find <right> tag
-top_elem = frame.find('top')        # Find <top> tag
-bottom_elem = frame.find('bottom')  # Find <bottom> tag
-
-# Check if all required elements are present
-# all() returns True only if all elements are not None
-if not all([left_elem, right_elem, top_elem, bottom_elem]):
-    # Return None if any element is missing
-    return None
-
-# Parse the color values from each element's text content
-# The 'or' clause handles cases where element.text might be None
-left = parse_color_values(left_elem.text or '')
-right = parse_color_values(right_elem.text or '')
-top = parse_color_values(top_elem.text or '')
-bottom = parse_color_values(bottom_elem.text or '')
-
-# Return all parsed data as a tuple
-return (frame_num, left, right, top, bottom)
-```
+    """
+    Extract and parse data from a single XML frame element.
+
+    Args:
+        frame: XML element containing frame data with 'number' attribute and
+               child elements: <left>, <right>, <top>, <bottom>
+
+    Returns:
+        Tuple of (frame_number, left_array, right_array, top_array, bottom_array)
+        Returns None if the frame is missing required elements
+    """
+    frame_num, texts = extract_frame_text(frame)
+    borders = parse_border_texts(texts)
+
+    # Return None if any element is missing, else all parsed data as a tuple
+    return None if borders is None else (frame_num, *borders)
+
+def convert_xml_to_border_pack(xml_filepath, pack_filepath, keyframe_interval=30, level=6):
+    """
+    Convert a border XML file to the compact binary border pack format.
+
+    process_xml_file reads the pack in place of the XML, with random access
+    by frame and no text parsing (see border_pack).
+
+    Args:
+        xml_filepath: Path to the XML file containing frame definitions
+        pack_filepath: Path of the border pack to write (e.g. "frames.bpk")
+        keyframe_interval: Frames between self-contained keyframes
+        level: zlib level for the frame records (0 = no compression)
+
+    Returns:
+        Number of frames written
+    """
+    # Parse through the compiled cache (reused if it is already up to date)
+    cache = load_frame_cache(xml_filepath, 'edges', extract_frame_text, parse_border_texts,
+                             np.uint32, 4)
+
+    frames = ((frame_num, *cache.frame(i)) for i, frame_num in enumerate(cache.frame_nums.tolist()))
+    count, size = write_border_pack(pack_filepath, frames, cache.skipped.tolist(),
+                                    keyframe_interval, level)
+
+    # Report how much smaller the pack is than the XML
+    xml_size = os.path.getsize(xml_filepath)
+    print(f"Wrote {count} frame(s) to {pack_filepath}: {size} bytes "
+          f"({xml_size / max(size, 1):.1f}x smaller than the {xml_size} byte XML)")
+    return count
+
+def build_edge_cache(xml_filepath, max_workers, backend='auto'):
+    """
+    Compile the border cache of an XML file, parsing on a worker pool.
+
+    The frame count is unknown until the XML has been read, so the pool is
+    sized from the file instead: about one worker per PARSE_BYTES_PER_WORKER
+    of XML, up to max_workers (a small XML is parsed without forking a
+    process per core).
+
+    Args:
+        xml_filepath: Path to the XML file containing frame definitions
+        max_workers: Largest number of parsing workers
+        backend: 'auto' (processes, as parsing is CPU-bound) or a backend name
+
+    Returns:
+        FrameCache of the parsed edges
+    """
+    workers = min(max_workers, 1 + os.path.getsize(xml_filepath) // PARSE_BYTES_PER_WORKER)
+    backend, _ = resolve_backend(backend, False, workers)
+    if backend == 'sequential':
+        workers = 1
+
+    with create_executor(backend, workers) as executor:
+        return load_frame_cache(xml_filepath, 'edges', extract_frame_text, parse_border_texts,
+                                np.uint32, 4, map_func=executor.map, batch_size=workers * 16)
 
 def print_progress_bar(current, total, start_time, bar_length=40):
-“””
-Display a real-time progress bar with statistics in the console.
-
-```
-Args:
-    current: Number of items completed so far
-    total: Total number of items to process
-    start_time: Timestamp when processing started (from time.time())
-    bar_length: Width of the progress bar in characters (default: 40)
-
-The progress bar updates in place using carriage return (\r) to overwrite
-the previous line, creating an animated effect.
-"""
-# Calculate progress as a fraction (0.0 to 1.0)
-progress = current / total
-
-# Calculate elapsed time in seconds
-elapsed = time.time() - start_time
-
-# Calculate estimated time remaining (ETA)
-if current > 0:
-    # Estimate based on average time per item
-    eta = (elapsed / current) * (total - current)
-    # Format as string with seconds
-    eta_str = f"{int(eta)}s"
-else:
-    # Can't calculate ETA before any items are complete
-    eta_str = "calculating..."
-
-# Create the visual progress bar
-# Calculate how many characters should be filled
-filled = int(bar_length * progress)
-# Create bar with filled (█) and empty (░) characters
-bar = '█' * filled + '░' * (bar_length - filled)
-
-# Print the progress bar (overwrites previous line with \r)
-# end='' prevents newline, flush=True forces immediate display
-print(f'\rProgress: [{bar}] {current}/{total} ({progress*100:.1f}%) | '
-      f'Elapsed: {int(elapsed)}s | ETA: {eta_str}', end='', flush=True)
-```
-
-def process_xml_file(xml_filepath, max_workers=None):
-“””
-Main function to process an XML file and generate all frame images.
-
-```
-This function orchestrates the entire process:
-1. Parse the XML file
-2. Extract all frame data
-3. Process frames in parallel
-4. Display progress
-5. Report statistics
-
-Args:
-    xml_filepath: Path to the XML file containing frame definitions
-    max_workers: Number of parallel worker processes to use
-                None = auto-detect based on CPU cores
-                1 = no parallelization (sequential processing)
-"""
-# Print initial status message
-print(f"Loading XML file: {xml_filepath}")
-
-# Parse the XML file into an element tree
-tree = ET.parse(xml_filepath)
-# Get the root element of the XML tree
-root = tree.getroot()
-
-# Find all <frame> elements anywhere in the XML tree
-# './/frame' uses XPath syntax: '//' means search at any depth
-frames = root.findall('.//frame')
-
-# Check if any frames were found
-if not frames:
-    print("No frame elements found in XML file.")
-    return  # Exit the function early
-
-# Count total number of frames found
-total_frames = len(frames)
-print(f"Found {total_frames} frame(s) to process.\n")
-
-# Parse all frame data from XML first (done sequentially as it's fast)
-print("Parsing XML data...")
-frame_data_list = []  # List to store all valid frame data
-
-# Loop through each frame element
-for frame in frames:
-    # Parse the frame data
-    data = parse_frame_data(frame)
-    
-    # Check if parsing was successful
-    if data:
-        # Add valid frame data to our list
-        frame_data_list.append(data)
+    """
+    Display a real-time progress bar with statistics in the console.
+
+    Args:
+        current: Number of items completed so far
+        total: Total number of items to process
+        start_time: Timestamp when processing started (from time.time())
+        bar_length: Width of the progress bar in characters (default: 40)
+
+    The progress bar updates in place using carriage return (\r) to overwrite
+    the previous line, creating an animated effect.
+    """
+    # Calculate progress as a fraction (0.0 to 1.0)
+    progress = current / total
+
+    # Calculate elapsed time in seconds
+    elapsed = time.time() - start_time
+
+    # Calculate estimated time remaining (ETA)
+    if current > 0:
+        # Estimate based on average time per item
+        eta = (elapsed / current) * (total - current)
+        # Format as string with seconds
+        eta_str = f"{int(eta)}s"
     else:
-        # Frame was missing required tags, print warning
-        frame_num = int(frame.get('number', 0))
+        # Can't calculate ETA before any items are complete
+        eta_str = "calculating..."
+
+    # Create the visual progress bar
+    # Calculate how many characters should be filled
+    filled = int(bar_length * progress)
+    # Create bar with filled (█) and empty (░) characters
+    bar = '█' * filled + '░' * (bar_length - filled)
+
+    # Print the progress bar (overwrites previous line with \r)
+    # end='' prevents newline, flush=True forces immediate display
+    print(f'\rProgress: [{bar}] {current}/{total} ({progress*100:.1f}%) | '
+          f'Elapsed: {int(elapsed)}s | ETA: {eta_str}', end='', flush=True)
+
+def process_xml_file(xml_filepath, max_workers=None, tasks_per_worker=2, dedup=None,
+                     output_dir=None, filename_template=FILENAME_TEMPLATE, encoder='png',
+                     backend='auto', incremental=False, resume=False,
+                     shard=None, frame_ranges=None, stats_path=None):
+    """
+    Main function to process an XML file and generate all frame images.
+
+    This function orchestrates the entire process:
+    1. Load the XML file (via the compiled cache)
+    2. Extract all frame data
+    3. Process frames in parallel
+    4. Display progress
+    5. Report statistics
+
+    Args:
+        xml_filepath: Path to the XML file containing frame definitions, or
+                      to a border pack converted from one
+        max_workers: Number of parallel workers to use
+                    None = auto-detect based on CPU cores
+                    1 = no parallelization (sequential processing, with backend='auto')
+        tasks_per_worker: How many frames each worker may have queued at once;
+                          at most max_workers * tasks_per_worker frames are
+                          submitted (and pickled) at any time
+        dedup: Skip re-encoding frames whose borders and size match an earlier frame
+               None = encode every frame
+               'link' = hardlink duplicates to the first frame's file
+               'copy' = copy the first frame's file
+        output_dir: Directory for the frame files (None = current directory)
+        filename_template: Output filename format with {frame}, {pad} and {ext}
+                           fields; {pad} grows to fit the largest frame number
+        encoder: Encoder profile name from ENCODER_PROFILES (e.g. 'png-fast',
+                 'tga', 'npy') or a custom profile dict
+        backend: How frames are executed
+                 'auto' = threads for uncompressed encoders, processes otherwise
+                 'sequential' = in this process, one frame at a time
+                 'thread' = thread pool (no process startup or pickling)
+                 'process' = process pool (scales CPU-heavy encodes past the GIL)
+        incremental: Skip frames whose borders and settings match the output
+                     manifest of an earlier run and whose file is unchanged
+                     (the manifest is written on every run)
+        resume: Skip the frames an interrupted run with the same settings had
+                finished, as listed in its journal (every run journals its
+                finished frames as they are written)
+        shard: 'i/N' (or (i, N)) to process only the i-th of N equal slices
+               of the XML's frames, counting from 0 (see border_shard)
+        frame_ranges: Only process these frame numbers, e.g. "0-99,200-299"
+                      or [(0, 99), (200, 299)] (combined with shard, the
+                      ranges are split N ways)
+        stats_path: Where to write the run's stats as JSON (default for
+                    sharded runs: border_stats.<shard>.json in the output
+                    directory; merge them with border_shard.py)
+    """
+    # Print initial status message
+    print(f"Loading XML file: {xml_filepath}")
+
+    # Determine number of parallel workers to use
+    if max_workers is None:
+        # Auto-detect: use CPU count
+        # os.cpu_count() returns number of CPU cores, or None if undetermined
+        max_workers = os.cpu_count() or 1
+
+    # Validate the shard selection before any work is done
+    shard = parse_shard(shard)
+    frame_ranges = parse_frame_ranges(frame_ranges)
+    label = shard_label(shard, frame_ranges)
+    if label and stats_path is None:
+        stats_path = stats_path_for(output_dir, label)
+
+    # Load parsed frames from the compiled sidecar cache. On the first run
+    # (or after the XML changed) the XML is streamed frame by frame: the
+    # main process only extracts the raw text and the workers parse it.
+    # Later runs memory-map the cache and skip XML parsing entirely.
+    # A border pack (see convert_xml_to_border_pack) is read directly.
+    if is_border_pack(xml_filepath):
+        print("Reading border pack...")
+        cache = BorderPack(xml_filepath)
+    else:
+        cache = open_frame_cache(xml_filepath, 'edges', 4)
+        if cache is None:
+            print("Parsing XML data...")
+            cache = build_edge_cache(xml_filepath, max_workers, backend)
+
+    # Frames that were missing border tags are reported, then skipped
+    for frame_num in cache.skipped.tolist():
         print(f"\nWarning: Frame {frame_num} missing border tags, skipping.")
 
-# Check if we have any valid frames to process
-if not frame_data_list:
-    print("No valid frames to process.")
-    return  # Exit if no valid frames
-
-print(f"\nProcessing {len(frame_data_list)} valid frames...\n")
-
-# Determine number of parallel workers to use
-if max_workers is None:
-    # Auto-detect: use CPU count, but no more workers than frames
-    # os.cpu_count() returns number of CPU cores, or None if undetermined
-    max_workers = min(os.cpu_count() or 1, len(frame_data_list))
-
-# Initialize tracking variables
-completed = 0  # Counter for completed frames
-errors = []    # List to collect any errors that occur
-start_time = time.time()  # Record start time for statistics
-
-# Create a process pool for parallel execution
-# ProcessPoolExecutor spawns separate processes to bypass Python's GIL
-with ProcessPoolExecutor(max_workers=max_workers) as executor:
-    # Submit all frame processing tasks to the executor
-    # This creates a dictionary mapping Future objects to frame numbers
-    future_to_frame = {executor.submit(create_frame_from_borders, data): data[0] 
-                      for data in frame_data_list}
-    
-    # Process completed tasks as they finish (not necessarily in order)
-    # as_completed() yields futures as they complete
-    for future in as_completed(future_to_frame):
-        # Get the frame number associated with this future
-        frame_num = future_to_frame[future]
-        
+    # Count total number of <frame> elements found (valid + skipped)
+    total_frames = len(cache) + len(cache.skipped)
+
+    # Check if any frames were found
+    if not total_frames:
+        print("No frame elements found in XML file.")
+        return  # Exit the function early
+
+    print(f"Found {total_frames} frame(s) in XML file.")
+
+    # Positions of the frames this run processes: all of them, or only
+    # this node's share when sharded (the other frames' data in the
+    # mapped cache is never read)
+    positions = select_shard(cache.frame_nums, shard, frame_ranges)
+    if label:
+        print(f"Shard {label}: {len(positions)} of {len(cache)} valid frame(s).")
+
+    # Count the valid frames (their data stays in the cache until submitted)
+    valid_frames = len(positions)
+
+    # Check if we have any valid frames to process
+    if not valid_frames and not label:
+        print("No valid frames to process.")
+        return  # Exit if no valid frames
+
+    # Process pools fork every worker up front, so never start more
+    # workers than there are frames
+    max_workers = min(max_workers, max(valid_frames, 1))
+
+    # Pick the execution backend: uncompressed encoders are I/O-bound, and
+    # Pillow releases the GIL while writing, so threads avoid the startup and
+    # pickling cost of processes; compressed encoders are CPU-bound
+    io_bound = get_encoder_profile(encoder).get('io_bound', False)
+    backend, reason = resolve_backend(backend, io_bound, max_workers)
+    if backend == 'sequential':
+        max_workers = 1
+    print(f"Execution backend: {backend} ({reason})")
+
+    print(f"\nProcessing {valid_frames} valid frames...\n")
+
+    # Create the worker pool (or inline executor) for parallel execution
+    with create_executor(backend, max_workers) as executor:
+
+        # Output settings shared by every frame; padding is wide enough for
+        # the largest frame number so filenames keep sorting correctly (and
+        # match across shards)
+        largest = int(np.abs(cache.frame_nums).max()) if len(cache) else 0
+        output = {
+            'output_dir': output_dir,
+            'filename_template': filename_template,
+            'pad': max(DEFAULT_OUTPUT['pad'], len(str(largest))),
+            'encoder': encoder,
+        }
+
+        # Fail fast on a bad template or encoder instead of once per frame
+        frame_filename(largest, output)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+
+        # Lazily yield frame data as (frame_num, left, right, top, bottom) tuples
+        frame_data_iter = ((int(cache.frame_nums[i]), *cache.frame(i))
+                           for i in positions.tolist())
+
+        # Maximum number of submitted but unfinished frames
+        window = max_workers * max(tasks_per_worker, 1)
+
+        # Initialize tracking variables
+        completed = 0  # Counter for completed frames
+        errors = []    # List to collect any errors that occur
+        start_time = time.time()  # Record start time for statistics
+
+        # Deduplication state, keyed by the content hash of each frame
+        originals = {}  # Hash -> frame number of the first frame with that content
+        written = {}    # Hash -> output filename of that frame (None if it failed)
+        waiting = {}    # Hash -> duplicate frame numbers waiting for the original
+        unique_count = 0     # Frames actually encoded
+        duplicate_count = 0  # Frames reproduced from an earlier identical frame
+
+        # Manifest of what each output was built from; on incremental reruns
+        # frames whose entry still matches are skipped entirely
+        settings = {'tool': 'pyborder2', 'encoder': get_encoder_profile(encoder)}
+        manifest = Manifest(output_dir, settings, label)
+        skipped_count = 0
+
+        # Journal of finished frames, so a killed run can be resumed; the
+        # resumed run also restores the manifest entries it never saved
+        journal = Journal(output_dir, settings, resume, label,
+                          [frame_filename(int(cache.frame_nums[i]), output) for i in positions.tolist()])
+        if resume:
+            manifest.restore(journal.manifest_entries())
+
+        def finish_duplicate(frame_num, digest):
+            # Reproduce a duplicate frame from its finished original
+            nonlocal completed, duplicate_count
+            source = written[digest]
+            if source is None:
+                errors.append(f"Frame {frame_num}: identical frame {originals[digest]} failed")
+            else:
+                try:
+                    filename = frame_filename(frame_num, output)
+                    link_or_copy(source, filename, dedup)
+                    journal.append(filename, manifest.record(filename, None, digest.hex()))
+                    duplicate_count += 1
+                except OSError as e:
+                    errors.append(f"Frame {frame_num}: {str(e)}")
+            completed += 1
+            print_progress_bar(completed, valid_frames, start_time)
+
+        def frames_to_encode():
+            # Yield only frames that need encoding; up-to-date and already
+            # finished frames are skipped and duplicates are linked as soon
+            # as (or once) their original has been written
+            nonlocal unique_count, skipped_count, completed
+            for data in frame_data_iter:
+                digest = hash_frame_borders(*data[1:])
+
+                if incremental or resume:
+                    filename = frame_filename(data[0], output)
+                    if ((resume and journal.is_done(filename))
+                            or (incremental and manifest.is_current(filename, None, digest.hex()))):
+                        # The existing file can serve as original for duplicates
+                        if dedup and digest not in originals:
+                            originals[digest] = data[0]
+                            written[digest] = filename
+                        skipped_count += 1
+                        completed += 1
+                        print_progress_bar(completed, valid_frames, start_time)
+                        continue
+
+                if dedup:
+                    if digest in originals:
+                        if digest in written:
+                            finish_duplicate(data[0], digest)
+                        else:
+                            waiting.setdefault(digest, []).append(data[0])
+                        continue
+                    originals[digest] = data[0]
+                unique_count += 1
+                yield data, digest
+
+        # The manifest is saved even if the run is interrupted, so the frames
+        # that did finish are not rebuilt next time
         try:
-            # Get the result from the completed task
-            result_frame_num, success, message = future.result()
-            
-            # Check if the task encountered an error
-            if not success:
-                # Add error message to our error list
-                errors.append(f"Frame {result_frame_num}: {message}")
-        except Exception as e:
-            # Catch any exceptions that occurred during processing
-            errors.append(f"Frame {frame_num}: {str(e)}")
-        
-        # Increment completed counter
-        completed += 1
-        
-        # Update the progress bar display
-        print_progress_bar(completed, len(frame_data_list), start_time)
-
-# Calculate total elapsed time
-elapsed = time.time() - start_time
-
-# Print final statistics on a new line
-print(f"\n\nCompleted! Processed {completed} frames in {elapsed:.2f}s")
-print(f"Average: {elapsed/completed:.3f}s per frame")
-
-# If there were any errors, report them
-if errors:
-    print(f"\n{len(errors)} error(s) occurred:")
-    # Print each error with a bullet point
-    for error in errors:
-        print(f"  - {error}")
-```
+            encode_iter = frames_to_encode()
+
+            # Fill the submission window; this dictionary maps in-flight
+            # Future objects to their (frame number, content hash)
+            future_to_frame = {executor.submit(create_frame_from_borders, data, output): (data[0], digest)
+                               for data, digest in islice(encode_iter, window)}
+
+            # Keep going until every submitted frame has finished
+            while future_to_frame:
+                # Block until at least one in-flight frame completes
+                done, _ = wait(future_to_frame, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    # Get (and release) the frame number associated with this future
+                    frame_num, digest = future_to_frame.pop(future)
+                    filename = None
+
+                    try:
+                        # Get the result from the completed task
+                        result_frame_num, success, message = future.result()
+
+                        # Check if the task encountered an error
+                        if not success:
+                            # Add error message to our error list
+                            errors.append(f"Frame {result_frame_num}: {message}")
+                        else:
+                            filename = message
+                            journal.append(filename, manifest.record(filename, None, digest.hex()))
+                    except Exception as e:
+                        # Catch any exceptions that occurred during processing
+                        errors.append(f"Frame {frame_num}: {str(e)}")
+
+                    # Increment completed counter
+                    completed += 1
+
+                    # Update the progress bar display
+                    print_progress_bar(completed, valid_frames, start_time)
+
+                    # Now that the original is written, reproduce its duplicates
+                    if dedup:
+                        written[digest] = filename
+                        for duplicate_num in waiting.pop(digest, []):
+                            finish_duplicate(duplicate_num, digest)
+
+                # Refill the window with one new frame per finished frame
+                for data, digest in islice(encode_iter, len(done)):
+                    future_to_frame[executor.submit(create_frame_from_borders, data, output)] = (data[0], digest)
+        finally:
+            manifest.save()
+            journal.close()
+
+    # Calculate total elapsed time
+    elapsed = time.time() - start_time
+
+    # Print final statistics on a new line
+    print(f"\n\nCompleted! Processed {completed} frames in {elapsed:.2f}s")
+    print(f"Average: {elapsed/max(completed, 1):.3f}s per frame ({backend} backend, {max_workers} worker(s))")
+
+    # Report how many frames an incremental or resumed run could skip
+    if incremental or resume:
+        print(f"Frames rebuilt: {completed - skipped_count}, "
+              f"skipped (up to date): {skipped_count}")
+
+    # Report how much encoding the deduplication saved
+    if dedup:
+        print(f"Dedup: {unique_count} unique frame(s) encoded, "
+              f"{duplicate_count} duplicate(s) {'linked' if dedup == 'link' else 'copied'} "
+              f"({duplicate_count / max(completed, 1) * 100:.1f}% of frames skipped encoding)")
+
+    # If there were any errors, report them
+    if errors:
+        print(f"\n{len(errors)} error(s) occurred:")
+        # Print each error with a bullet point
+        for error in errors:
+            print(f"  - {error}")
+
+    # Write the machine-readable stats for merging the shards' reports
+    if stats_path:
+        # Dedup counters only mean something when duplicates were looked for
+        dedup_stats = {'unique': unique_count, 'duplicates': duplicate_count} if dedup else {}
+        write_shard_stats(stats_path, 'pyborder2', shard, frame_ranges, start_time,
+                          frames_total=valid_frames, frames_done=completed - skipped_count,
+                          frames_skipped=skipped_count, errors=errors,
+                          backend=backend, workers=max_workers, **dedup_stats)
+        print(f"\nStats written to: {stats_path}")
 
 # This block only runs when the script is executed directly (not imported)
 
-if **name** == “**main**”:
-# Define the XML file to process
-xml_file = “frames.xml”  # Change this to your actual XML file path
-
-```
-try:
-    # Call the main processing function
-    # max_workers parameter controls parallelization:
-    #   None = automatic (uses all CPU cores)
-    #   1 = sequential processing (no parallelization)
-    #   N = use N parallel workers
-    process_xml_file(xml_file, max_workers=None)
-    
-except FileNotFoundError:
-    # Handle case where XML file doesn't exist
-    print(f"Error: XML file '{xml_file}' not found.")
-    
-except Exception as e:
-    # Catch any other unexpected errors
-    print(f"Error processing XML: {e}")
-```
\ No newline at end of file
+if __name__ == "__main__":
+    # Define the XML file to process
+    xml_file = "frames.xml"  # Change this to your actual XML file path
+
+    try:
+        # Call the main processing function
+        # max_workers parameter controls parallelization:
+        #   None = automatic (uses all CPU cores)
+        #   1 = sequential processing (no parallelization)
+        #   N = use N parallel workers
+        process_xml_file(xml_file, max_workers=None)
+
+    except FileNotFoundError:
+        # Handle case where XML file doesn't exist
+        print(f"Error: XML file '{xml_file}' not found.")
+
+    except Exception as e:
+        # Catch any other unexpected errors
+        print(f"Error processing XML: {e}")
@@ -2,320 +2,1017 @@ from PIL import Image
 import xml.etree.ElementTree as ET
 import numpy as np
 import os
-import glob
-from multiprocessing import Pool, cpu_count
+import io
+import shutil
+from multiprocessing import cpu_count
 import time
+import threading
+from border_xml import build_frame_index
+from border_cache import PIXEL_DTYPE, load_pixel_cache, load_pixel_frames, open_cache_data
+from border_formats import (probe_uncompressed_layout, pixel_byte_offsets, native_mode, native_colors,
+                            is_deep_rgb, read_deep_frame, write_deep_frame, encode_deep_frame,
+                            raw_layout, NATIVE_MODES, DEEP_SCALE, DEEP_CHANNELS, RAW_EXTENSIONS)
+from border_backend import resolve_backend, create_pool, Prefetcher, WriterPool
+from border_sequence import discover_sequence, print_sequence_report
+from border_manifest import Manifest, file_signature, payload_digest
+from border_journal import Journal, atomic_output
+from border_geometry import border_geometry
+from border_shard import (parse_shard, parse_frame_ranges, shard_label, select_shard,
+                          stats_path_for, write_shard_stats)
+
+def as_pixel_array(pixels):
+    """
+    Converts a frame's pixel list to a PIXEL_DTYPE structured array.
+
+    Args:
+        pixels: Structured array, or sequence of (x, y, r, g, b) tuples
+
+    Returns:
+        NumPy structured array with fields x, y, r, g, b
+    """
+    if isinstance(pixels, np.ndarray) and pixels.dtype == PIXEL_DTYPE:
+        return pixels
+    return np.array([tuple(p) for p in pixels], dtype=PIXEL_DTYPE)
+
+def select_border_pixels(pixels, width, height):
+    """
+    Validates a frame's pixels against the image size in one pass.
+
+    The perimeter lookup tables of each frame size are built once per
+    worker and shared by every frame of that size (see border_geometry).
+
+    Args:
+        pixels: PIXEL_DTYPE structured array
+        width: Image width
+        height: Image height
+
+    Returns:
+        Tuple of (pixels to write, pixel_count). Only the last entry per
+        position is kept so duplicates resolve like a sequential write;
+        pixel_count still counts every valid entry.
+    """
+    return border_geometry(width, height).select(pixels)
+
+def paste_border_pixels(img, pixels):
+    """
+    Writes validated border pixels into an image strip by strip.
+
+    Only the 1-pixel edge strips that receive pixels are copied out to
+    numpy, updated and pasted back, so the full frame is never copied.
+    Colors are scaled to the image's native depth and alpha is kept.
+
+    Args:
+        img: PIL Image in one of border_formats.NATIVE_MODES (modified in place)
+        pixels: PIXEL_DTYPE array from select_border_pixels
+    """
+    width, height = img.size
+    x = pixels['x']
+    y = pixels['y']
+    colors = native_colors(img.mode, pixels['r'], pixels['g'], pixels['b'])
+
+    # Each pixel goes to exactly one strip; top and bottom rows own the
+    # corners, the left and right strips cover the rows in between
+    top = y == 0
+    bottom = ~top & (y == height - 1)
+    left = ~top & ~bottom & (x == 0)
+    right = ~top & ~bottom & ~left
+
+    # (mask, crop box, strip column index, strip row index)
+    strips = (
+        (top, (0, 0, width, 1), x, y),
+        (bottom, (0, height - 1, width, height), x, y - (height - 1)),
+        (left, (0, 1, 1, height - 1), x, y - 1),
+        (right, (width - 1, 1, width, height - 1), x - (width - 1), y - 1),
+    )
+
+    for mask, box, cols, rows in strips:
+        if not mask.any():
+            continue
+
+        strip = np.array(img.crop(box))
+        if strip.ndim == 2:
+            strip[rows[mask], cols[mask]] = colors[mask, 0]
+        else:
+            # Only the color channels are written; alpha stays as it was
+            strip[rows[mask], cols[mask], :colors.shape[1]] = colors[mask]
+        img.paste(Image.fromarray(strip), box[:2])
+
+def patch_deep_pixels(frame, pixels):
+    """
+    Writes border pixels into a 16-bit RGB(A) frame at full depth.
+
+    Args:
+        frame: NumPy uint16 BGR(A) array from border_formats.read_deep_frame
+               (modified in place)
+        pixels: PIXEL_DTYPE structured array
+
+    Returns:
+        Number of border pixels set
+    """
+    height, width = frame.shape[:2]
+    valid, pixel_count = select_border_pixels(pixels, width, height)
+
+    # Scale to 16 bits; the alpha channel (if any) is left untouched
+    for channel, index in zip(('r', 'g', 'b'), DEEP_CHANNELS):
+        frame[valid['y'], valid['x'], index] = valid[channel].astype(np.uint16) * DEEP_SCALE
+
+    return pixel_count
+
+def patch_border_bytes(buffer, pixels, layout):
+    """
+    Writes border pixels into the bytes of an uncompressed frame file.
+
+    Args:
+        buffer: Writable uint8 array over the whole file (memory map or
+                in-memory copy)
+        pixels: PIXEL_DTYPE structured array
+        layout: Pixel layout from border_formats.probe_uncompressed_layout
+
+    Returns:
+        Number of border pixels set
+    """
+    valid, pixel_count = select_border_pixels(pixels, layout['width'], layout['height'])
+
+    # Scatter each channel to its byte inside the stored pixel
+    base = pixel_byte_offsets(layout, valid['x'], valid['y'])
+    for channel, index in zip(('r', 'g', 'b'), layout['channels']):
+        buffer[base + index] = valid[channel]
+
+    return pixel_count
+
+def patch_border_inplace(image_path, pixels, output_path, layout):
+    """
+    Writes border pixels straight into an uncompressed frame file.
+
+    The source file is copied as-is and only the bytes of the border pixels
+    are rewritten through a memory map, so the frame is never decoded or
+    re-encoded and all other pixels stay untouched.
+
+    A separate output is patched under a temporary name and renamed into
+    place. Patching the input itself rewrites it directly; the patch only
+    ever writes the same bytes, so an interrupted run is repaired by simply
+    running it again.
+
+    Args:
+        image_path: Path to input image
+        pixels: PIXEL_DTYPE structured array
+        output_path: Path to save output image (may equal image_path)
+        layout: Pixel layout from border_formats.probe_uncompressed_layout
+
+    Returns:
+        Number of border pixels set
+    """
+    if os.path.abspath(image_path) == os.path.abspath(output_path):
+        return patch_border_file(output_path, pixels, layout)
+
+    with atomic_output(output_path) as tmp_path:
+        shutil.copyfile(image_path, tmp_path)
+        return patch_border_file(tmp_path, pixels, layout)
+
+def patch_border_file(path, pixels, layout):
+    """
+    Rewrites the border pixel bytes of an uncompressed frame file through a
+    memory map.
+
+    Args:
+        path: Frame file to patch
+        pixels: PIXEL_DTYPE structured array
+        layout: Pixel layout from border_formats.probe_uncompressed_layout
+
+    Returns:
+        Number of border pixels set
+    """
+    data = np.memmap(path, dtype=np.uint8, mode='r+')
+    pixel_count = patch_border_bytes(data, pixels, layout)
+    data.flush()
+    del data
+
+    return pixel_count
+
+def frame_layout(image_path, patch_mode, raw_size, data=None):
+    """
+    Decides whether a frame is patched in place or decoded.
+
+    Args:
+        image_path: Path to input image
+        patch_mode: 'auto', 'inplace' or 'decode' (see apply_frame_border_numpy)
+        raw_size: (width, height) of headerless .rgb/.raw frames
+        data: File contents if they have already been read
+
+    Returns:
+        Pixel layout for in-place patching, or None to decode the frame
+    """
+    if patch_mode == 'decode':
+        return None
+
+    layout = probe_uncompressed_layout(image_path, raw_size, data)
+    if layout is None and patch_mode == 'inplace':
+        raise ValueError(f"{image_path} is not an uncompressed BMP/TGA/raw RGB frame")
+    return layout
+
+def apply_frame_border_numpy(image_path, frame_data, output_path, patch_mode='auto', raw_size=None):
+    """
+    Applies border colors to a single frame using numpy (FAST).
+
+    Args:
+        image_path: Path to input image
+        frame_data: Dictionary with frame number and pixel array
+        output_path: Path to save output image
+        patch_mode: 'auto' patches uncompressed BMP/TGA/raw frames in place
+                    and decodes everything else, 'inplace' requires an
+                    uncompressed frame, 'decode' always decodes
+        raw_size: (width, height) of headerless .rgb/.raw frames
+
+    Returns:
+        Tuple of (frame_num, pixel_count, processing_time)
+    """
+    start_time = time.time()
+
+    frame_num = frame_data['frame_num']
+    pixels = as_pixel_array(frame_data['pixels'])
+
+    # Uncompressed frames only need their border bytes rewritten
+    layout = frame_layout(image_path, patch_mode, raw_size)
+    if layout is not None:
+        pixel_count = patch_border_inplace(image_path, pixels, output_path, layout)
+        elapsed = time.time() - start_time
+        return (frame_num, pixel_count, elapsed)
+
+    # 16-bit RGB(A) frames bypass Pillow, which would reduce them to 8 bits
+    img = Image.open(image_path)
+    if is_deep_rgb(img):
+        frame = read_deep_frame(image_path)
+        if frame is not None:
+            pixel_count = patch_deep_pixels(frame, pixels)
+            with atomic_output(output_path) as tmp_path:
+                write_deep_frame(tmp_path, frame)
+            elapsed = time.time() - start_time
+            return (frame_num, pixel_count, elapsed)
+
+    # Keep the source mode and depth, converting only modes with no native path
+    img = native_mode(img)
+    width, height = img.size
+
+    valid, pixel_count = select_border_pixels(pixels, width, height)
+
+    # Patch only the edge strips of the decoded image, then save it directly
+    paste_border_pixels(img, valid)
+    with atomic_output(output_path) as tmp_path:
+        img.save(tmp_path)
+
+    elapsed = time.time() - start_time
+    return (frame_num, pixel_count, elapsed)
+
+def apply_frame_border_bytes(data, image_path, frame_data, output_path, patch_mode='auto', raw_size=None):
+    """
+    Applies border colors to a frame that has already been read into memory.
+
+    This is the compute stage of the staged pipeline: the input comes from
+    a prefetch thread and the encoded result goes back to a writer thread,
+    so no file I/O happens here.
+
+    Args:
+        data: Contents of image_path
+        image_path: Path the data was read from (selects the input format)
+        frame_data: Dictionary with frame number and pixel array
+        output_path: Path the result will be written to (selects the output format)
+        patch_mode: 'auto', 'inplace' or 'decode' (see apply_frame_border_numpy)
+        raw_size: (width, height) of headerless .rgb/.raw frames
+
+    Returns:
+        Tuple of (frame_num, pixel_count, processing_time, output bytes)
+    """
+    start_time = time.time()
+
+    frame_num = frame_data['frame_num']
+    pixels = as_pixel_array(frame_data['pixels'])
+
+    # Uncompressed frames: patch the border bytes of a copy of the file
+    layout = frame_layout(image_path, patch_mode, raw_size, data)
+    if layout is not None:
+        output = bytearray(data)
+        pixel_count = patch_border_bytes(np.frombuffer(output, dtype=np.uint8), pixels, layout)
+        elapsed = time.time() - start_time
+        return (frame_num, pixel_count, elapsed, output)
+
+    img = Image.open(io.BytesIO(data))
+    if is_deep_rgb(img):
+        frame = read_deep_frame(image_path, data)
+        if frame is not None:
+            pixel_count = patch_deep_pixels(frame, pixels)
+            output = encode_deep_frame(output_path, frame)
+            elapsed = time.time() - start_time
+            return (frame_num, pixel_count, elapsed, output)
+
+    img = native_mode(img)
+    width, height = img.size
+
+    valid, pixel_count = select_border_pixels(pixels, width, height)
+    paste_border_pixels(img, valid)
+
+    # Encode to memory in the format the output extension asks for
+    ext = os.path.splitext(output_path)[1].lower()
+    output = io.BytesIO()
+    img.save(output, format=Image.registered_extensions().get(ext, img.format))
+
+    elapsed = time.time() - start_time
+    return (frame_num, pixel_count, elapsed, output.getvalue())
+
+def parse_xml_sequence(xml_path, use_cache=True):
+    """
+    Parses the entire XML file and returns frame data.
+
+    Parsed frames come from the compiled sidecar cache (see border_cache),
+    which is only rebuilt when the XML has changed.
 
-def apply_frame_border_numpy(image_path, frame_data, output_path):
-“””
-Applies border colors to a single frame using numpy (FAST).
-
-```
-Args:
-    image_path: Path to input image
-    frame_data: Dictionary with frame number and pixel list
-    output_path: Path to save output image
-
-Returns:
-    Tuple of (frame_num, pixel_count, processing_time)
-"""
-start_time = time.time()
-
-# Open image and convert to numpy array (much faster than PIL pixel access)
-img = Image.open(image_path)
-img = img.convert('RGB')
-img_array = np.array(img)
-height, width = img_array.shape[:2]
-
-frame_num = frame_data['frame_num']
-pixels = frame_data['pixels']
-pixel_count = 0
-
-# Apply all pixels at once using numpy indexing (vectorized operation)
-for pixel in pixels:
-    x, y, r, g, b = pixel
-    
-    # Validate position is on the border
-    is_border = (x == 0 or x == width - 1 or 
-                y == 0 or y == height - 1)
-    
-    if 0 <= x < width and 0 <= y < height and is_border:
-        img_array[y, x] = [r, g, b]  # Note: numpy uses [y, x] indexing
-        pixel_count += 1
-
-# Convert back to PIL Image and save
-result_img = Image.fromarray(img_array)
-result_img.save(output_path)
-
-elapsed = time.time() - start_time
-return (frame_num, pixel_count, elapsed)
-```
-
-def parse_xml_sequence(xml_path):
-“””
-Parses the entire XML file and returns frame data.
-
-```
-Args:
-    xml_path: Path to XML file
-
-Returns:
-    Dictionary mapping frame numbers to pixel lists
-"""
-tree = ET.parse(xml_path)
-root = tree.getroot()
-
-frame_data = {}
-
-for frame_elem in root.findall('frame'):
-    frame_num = int(frame_elem.get('number'))
-    pixels = []
-    
-    for pixel_elem in frame_elem.findall('pixel'):
-        x = int(pixel_elem.get('x'))
-        y = int(pixel_elem.get('y'))
-        r = int(pixel_elem.get('r'))
-        g = int(pixel_elem.get('g'))
-        b = int(pixel_elem.get('b'))
-        pixels.append((x, y, r, g, b))
-    
-    frame_data[frame_num] = pixels
-
-return frame_data
-```
+    Args:
+        xml_path: Path to XML file
+        use_cache: False to force the cache to be rebuilt from the XML
+
+    Returns:
+        Dictionary mapping frame numbers to PIXEL_DTYPE pixel arrays
+    """
+    return load_pixel_frames(xml_path, use_cache)
+
+# Flat pixel array of the border cache, mapped once per worker process
+_worker_pixels = None
+
+# Keyword options for apply_frame_border_numpy, set once per worker
+_worker_options = {}
+
+def init_worker(cache_path, options=None):
+    """
+    Pool initializer: maps the border cache's pixel data in this worker.
+
+    Args:
+        cache_path: Path of the compiled cache file (FrameCache.path)
+        options: Keyword arguments passed to apply_frame_border_numpy
+    """
+    global _worker_pixels, _worker_options
+    _worker_pixels = open_cache_data(cache_path)
+    _worker_options = options or {}
 
 def process_single_frame(args):
-“””
-Wrapper function for multiprocessing pool.
-
-```
-Args:
-    args: Tuple of (image_path, frame_data, output_path)
-
-Returns:
-    Processing statistics
-"""
-return apply_frame_border_numpy(*args)
-```
-
-def process_image_sequence_optimized(input_pattern, xml_path, output_dir, num_workers=None):
-“””
-Processes image sequence with numpy and multiprocessing (OPTIMIZED).
-
-```
-Args:
-    input_pattern: Pattern for input images (e.g., "frames/frame_*.jpg")
-    xml_path: Path to XML file with sequence border data
-    output_dir: Directory to save output images
-    num_workers: Number of parallel workers (None = auto-detect CPUs)
-"""
-start_time = time.time()
-
-# Create output directory
-os.makedirs(output_dir, exist_ok=True)
-
-# Get all input images
-image_files = sorted(glob.glob(input_pattern))
-
-if not image_files:
-    print(f"No images found matching pattern: {input_pattern}")
-    return
-
-print(f"Found {len(image_files)} images to process")
-print(f"Using numpy arrays and multiprocessing")
-
-# Parse XML once (more efficient than parsing per frame)
-print("Parsing XML...")
-frame_data_dict = parse_xml_sequence(xml_path)
-print(f"Loaded data for {len(frame_data_dict)} frames")
-
-# Prepare arguments for parallel processing
-process_args = []
-for img_path in image_files:
-    basename = os.path.basename(img_path)
-    filename_no_ext = os.path.splitext(basename)[0]
-    
-    # Extract frame number
-    try:
-        frame_num = int(''.join(filter(str.isdigit, filename_no_ext)))
-    except ValueError:
-        frame_num = image_files.index(img_path)
-    
-    # Skip if no data for this frame
-    if frame_num not in frame_data_dict:
-        print(f"Warning: No XML data for frame {frame_num}")
-        continue
-    
-    output_path = os.path.join(output_dir, basename)
+    """
+    Wrapper function for multiprocessing pool.
+
+    Only the frame's offset/length slice into the shared cache is sent to
+    the worker; the pixels themselves are read from the mapped file.
+
+    Args:
+        args: Tuple of (image_path, frame_num, start, stop, output_path)
+
+    Returns:
+        Tuple of (frame_num, pixel_count, processing_time, output_path)
+    """
+    image_path, frame_num, start, stop, output_path = args
     frame_data = {
         'frame_num': frame_num,
-        'pixels': frame_data_dict[frame_num]
+        'pixels': _worker_pixels[start:stop]
+    }
+    return (*apply_frame_border_numpy(image_path, frame_data, output_path, **_worker_options), output_path)
+
+def process_prefetched_frame(args):
+    """
+    Pipeline worker: patches one prefetched frame in memory.
+
+    Args:
+        args: Tuple of (job, data) from the Prefetcher, where job is
+              (image_path, frame_num, start, stop, output_path) and data is
+              the file contents or the exception raised while reading it
+
+    Returns:
+        Tuple of (frame_num, pixel_count, processing_time, output_path, output bytes)
+    """
+    job, data = args
+    image_path, frame_num, start, stop, output_path = job
+    frame_data = {
+        'frame_num': frame_num,
+        'pixels': _worker_pixels[start:stop]
     }
-    
-    process_args.append((img_path, frame_data, output_path))
-
-# Determine number of workers
-if num_workers is None:
-    num_workers = cpu_count()
-
-print(f"\nProcessing with {num_workers} parallel workers...")
-
-# Process images in parallel
-with Pool(processes=num_workers) as pool:
-    results = pool.map(process_single_frame, process_args)
-
-# Print statistics
-total_pixels = sum(r[1] for r in results)
-total_time = time.time() - start_time
-
-print(f"\n{'='*60}")
-print(f"Processing complete!")
-print(f"{'='*60}")
-print(f"Total frames processed: {len(results)}")
-print(f"Total border pixels set: {total_pixels}")
-print(f"Total time: {total_time:.2f} seconds")
-print(f"Average time per frame: {total_time/len(results):.3f} seconds")
-print(f"Frames per second: {len(results)/total_time:.2f}")
-print(f"Output saved to: {output_dir}")
-```
-
-def process_image_sequence_standard(input_pattern, xml_path, output_dir):
-“””
-Standard processing without optimization (for comparison).
 
-```
-Args:
-    input_pattern: Pattern for input images
-    xml_path: Path to XML file
-    output_dir: Directory to save output images
-"""
-start_time = time.time()
+    # The frame is decoded from memory, so errors would otherwise only name
+    # a BytesIO object instead of the file
+    try:
+        if isinstance(data, BaseException):
+            raise data
+        frame_num, pixel_count, elapsed, output = apply_frame_border_bytes(
+            data, image_path, frame_data, output_path, **_worker_options)
+    except Exception as e:
+        raise RuntimeError(f"Frame {frame_num} ({image_path}): {e}") from e
+    return (frame_num, pixel_count, elapsed, output_path, output)
+
+def read_frame_file(job):
+    """Prefetch stage: reads the input file of a frame job."""
+    with open(job[0], 'rb') as f:
+        return f.read()
+
+def write_frame_file(output_path, data):
+    """Writer stage: writes one encoded output frame."""
+    with atomic_output(output_path) as tmp_path:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+
+def iter_frame_jobs(frames, cache, frame_positions, output_dir):
+    """
+    Lazily builds worker arguments, one frame at a time.
+
+    Args:
+        frames: List of (frame_num, image_path) from discover_sequence
+        cache: FrameCache holding the parsed border pixels
+        frame_positions: Frame number -> cache position (cache.index())
+        output_dir: Directory to save output images
+
+    Yields:
+        Tuples of (image_path, frame_num, start, stop, output_path)
+    """
+    for frame_num, img_path in frames:
+        basename = os.path.basename(img_path)
+
+        # Skip if no data for this frame
+        position = frame_positions.get(frame_num)
+        if position is None:
+            print(f"\nWarning: No XML data for frame {frame_num}")
+            continue
+
+        output_path = os.path.join(output_dir, basename)
+        start = int(cache.offsets[position])
+        stop = int(cache.offsets[position + 1])
+
+        yield (img_path, frame_num, start, stop, output_path)
+
+def print_progress(done, total, total_pixels, start_time):
+    """
+    Prints a single live progress line with throughput.
+
+    Args:
+        done: Frames finished so far
+        total: Number of input images
+        total_pixels: Border pixels set so far
+        start_time: Timestamp when processing started
+    """
+    elapsed = max(time.time() - start_time, 1e-9)
+    print(f"\rProcessed {done}/{total} frames | {done/elapsed:.2f} fps | "
+          f"{total_pixels} border pixels", end='', flush=True)
+
+def process_image_sequence_optimized(input_pattern, xml_path, output_dir, num_workers=None,
+                                     chunk_size=1, max_in_flight=None, patch_mode='auto',
+                                     raw_size=None, backend='auto', io_threads=0,
+                                     cache_listing=False, incremental=False, resume=False,
+                                     shard=None, frame_ranges=None, stats_path=None):
+    """
+    Processes image sequence with numpy and multiprocessing (OPTIMIZED).
+
+    Frames are streamed through imap_unordered with at most max_in_flight
+    unfinished tasks, and statistics are aggregated as results arrive, so
+    parent memory stays constant regardless of sequence length. A failing
+    frame stops the run as soon as its result comes back.
+
+    With io_threads > 0 the work is split into overlapping stages joined by
+    bounded queues: prefetch threads read input files ahead, the workers
+    only decode, patch and encode in memory, and writer threads flush the
+    results, so storage latency is hidden behind compute.
+
+    Args:
+        input_pattern: Pattern for input images (e.g., "frames/frame_####.jpg"
+                       or "frames/frame_*.jpg", see border_sequence)
+        xml_path: Path to XML file with sequence border data
+        output_dir: Directory to save output images
+        num_workers: Number of parallel workers (None = auto-detect CPUs)
+        chunk_size: Frames handed to a worker per task
+        max_in_flight: Maximum submitted but unfinished frames
+                       (None = 4 chunks per worker)
+        patch_mode: 'auto', 'inplace' or 'decode' (see apply_frame_border_numpy)
+        raw_size: (width, height) of headerless .rgb/.raw input frames
+        backend: 'sequential', 'thread', 'process' or 'auto' (threads when
+                 the frames are patched in place, which is I/O-bound;
+                 processes when they have to be decoded and re-encoded)
+        io_threads: Prefetch threads and writer threads (each) for the
+                    staged pipeline (0 = workers read and write their own files)
+        cache_listing: Reuse the input directory listing of an earlier run
+                       if the directory has not changed
+        incremental: Skip frames whose input image, border pixels and
+                     settings match the output manifest of an earlier run
+                     (the manifest is written on every run)
+        resume: Skip the frames an interrupted run with the same settings
+                had finished, as listed in its journal (every run journals
+                its finished frames)
+        shard: 'i/N' (or (i, N)) to process only the i-th of N equal slices
+               of the sequence, counting from 0 (see border_shard)
+        frame_ranges: Only process these frames, e.g. "0-99,200-299" or
+                      [(0, 99), (200, 299)] (combined with shard, the
+                      ranges are split N ways)
+        stats_path: Where to write the run's stats as JSON (default for
+                    sharded runs: border_stats.<shard>.json in output_dir;
+                    merge them with border_shard.py)
+    """
+    start_time = time.time()
+
+    # Create output directory
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Find all input images and their frame numbers
+    sequence = discover_sequence(input_pattern, cache_listing)
+    frames = sequence['frames']
+
+    if not frames:
+        print(f"No images found matching pattern: {input_pattern}")
+        return
+
+    print(f"Found {len(frames)} images to process")
+    print_sequence_report(sequence)
+
+    # Keep only this node's frames when the run is sharded
+    shard = parse_shard(shard)
+    frame_ranges = parse_frame_ranges(frame_ranges)
+    label = shard_label(shard, frame_ranges)
+    if label:
+        positions = select_shard([frame_num for frame_num, _ in frames], shard, frame_ranges)
+        print(f"Shard {label}: {len(positions)} of {len(frames)} images")
+        frames = [frames[i] for i in positions.tolist()]
+        if stats_path is None:
+            stats_path = stats_path_for(output_dir, label)
+
+    # Parse XML once into the memory-mapped cache; workers map the same
+    # file, so frames are never pickled or duplicated in the parent
+    print("Parsing XML...")
+    cache = load_pixel_cache(xml_path)
+    frame_positions = cache.index()
+    print(f"Loaded data for {len(frame_positions)} frames")
+
+    # Determine number of workers
+    if num_workers is None:
+        num_workers = cpu_count()
+
+    # Uncompressed frames patched in place spend their time in file I/O
+    io_bound = (patch_mode != 'decode' and bool(frames)
+                and probe_uncompressed_layout(frames[0][1], raw_size) is not None)
+    backend, reason = resolve_backend(backend, io_bound, num_workers)
+    print(f"Using numpy arrays and the {backend} backend ({reason})")
+    if backend == 'sequential':
+        num_workers = 1
+
+    # The pool fills a whole chunk before sending it, so the window must
+    # hold at least one chunk or submission would stall
+    if max_in_flight is None:
+        max_in_flight = num_workers * chunk_size * 4
+    max_in_flight = max(max_in_flight, chunk_size)
+
+    print(f"\nProcessing with {num_workers} parallel workers "
+          f"(chunk size {chunk_size}, up to {max_in_flight} frames in flight)...")
+    if io_threads:
+        print(f"Staged pipeline: {io_threads} prefetch and {io_threads} writer thread(s)")
+
+    # The pool's feeder thread blocks on this semaphore, so at most
+    # max_in_flight jobs have been created and not yet finished
+    window = threading.Semaphore(max_in_flight)
+    stopped = threading.Event()
+
+    # Manifest entries (input signature, payload hash) of submitted frames,
+    # recorded once their output has been written
+    settings = {'tool': 'pyborderfast', 'patch_mode': patch_mode, 'raw_size': raw_size}
+    manifest = Manifest(output_dir, settings, label)
+    signatures = {}
+    skipped = 0
+
+    # Journal of finished frames; a resumed run also restores the manifest
+    # entries the interrupted run never got to save
+    journal = Journal(output_dir, settings, resume, label,
+                      [os.path.join(output_dir, os.path.basename(path)) for _, path in frames])
+    if resume:
+        manifest.restore(journal.manifest_entries())
+
+    def pending_jobs():
+        # Skip frames whose output is still up to date (incremental reruns)
+        # or that the interrupted run finished (resumed runs)
+        nonlocal skipped
+        for job in iter_frame_jobs(frames, cache, frame_positions, output_dir):
+            image_path, frame_num, start, stop, output_path = job
+            if resume and journal.is_done(output_path):
+                skipped += 1
+                continue
+            entry = (file_signature(image_path), payload_digest(cache.data[start:stop]))
+            if incremental and manifest.is_current(output_path, *entry):
+                skipped += 1
+                continue
+            signatures[output_path] = entry
+            yield job
+
+    def record(output_path):
+        journal.append(output_path, manifest.record(output_path, *signatures.pop(output_path)))
+
+    def write_and_record(output_path, data):
+        write_frame_file(output_path, data)
+        record(output_path)
+
+    jobs = pending_jobs()
+    prefetcher = writer = None
+    worker = process_single_frame
+    if io_threads:
+        # Readers stay up to max_in_flight frames ahead of the workers and
+        # at most max_in_flight encoded frames wait for the writers
+        prefetcher = Prefetcher(jobs, read_frame_file, io_threads, max_in_flight, stopped)
+        writer = WriterPool(write_and_record, io_threads, max_in_flight)
+        jobs = prefetcher
+        worker = process_prefetched_frame
+
+    def bounded_jobs():
+        for job in jobs:
+            window.acquire()
+            if stopped.is_set():
+                return
+            yield job
+
+    frames_done = 0
+    total_pixels = 0
+    last_report = 0.0
+
+    # Process images in parallel, aggregating results as they arrive
+    options = {'patch_mode': patch_mode, 'raw_size': raw_size}
+    with create_pool(backend, num_workers, initializer=init_worker,
+                     initargs=(cache.path, options)) as pool:
+        try:
+            for result in pool.imap_unordered(worker, bounded_jobs(), chunksize=chunk_size):
+                window.release()
+                frame_num, pixel_count, elapsed, output_path = result[:4]
+                if writer is not None:
+                    # Blocks while the writers are behind
+                    writer.put(*result[3:])
+                else:
+                    record(output_path)
+                frames_done += 1
+                total_pixels += pixel_count
+
+                if time.time() - last_report >= 0.5:
+                    last_report = time.time()
+                    print_progress(frames_done + skipped, len(frames), total_pixels, start_time)
+
+            if writer is not None:
+                writer.close()
+        finally:
+            # Unblock the feeder thread and let the frames already handed to
+            # the pool finish: terminating workers while the pool is still
+            # sending them a task can deadlock the shutdown
+            stopped.set()
+            window.release()
+            pool.close()
+            pool.join()
+            if prefetcher is not None:
+                prefetcher.join()
+                writer.close(raise_error=False)
+            # Keep the frames that did finish, even if the run failed
+            manifest.save()
+            journal.close()
+
+    print_progress(frames_done + skipped, len(frames), total_pixels, start_time)
+    print()
+
+    # Print statistics
+    total_time = time.time() - start_time
+
+    print(f"\n{'='*60}")
+    print(f"Processing complete!")
+    print(f"{'='*60}")
+    print(f"Total frames processed: {frames_done}")
+    if incremental or resume:
+        print(f"Frames rebuilt: {frames_done}, skipped (up to date): {skipped}")
+    print(f"Total border pixels set: {total_pixels}")
+    print(f"Total time: {total_time:.2f} seconds")
+    print(f"Average time per frame: {total_time/max(frames_done, 1):.3f} seconds")
+    print(f"Frames per second: {frames_done/total_time:.2f}")
+    print(f"Execution backend: {backend}")
+    print(f"Output saved to: {output_dir}")
+
+    if stats_path:
+        write_shard_stats(stats_path, 'pyborderfast', shard, frame_ranges, start_time,
+                          frames_total=len(frames), frames_done=frames_done,
+                          frames_skipped=skipped, pixels=total_pixels,
+                          backend=backend, workers=num_workers)
+        print(f"Stats written to: {stats_path}")
+
+def read_frame_colors(image_path, raw_size=None):
+    """
+    Decodes a rendered frame for verification.
+
+    Args:
+        image_path: Path to the frame
+        raw_size: (width, height) of headerless .rgb/.raw frames
+
+    Returns:
+        Tuple of (pixel array of shape (height, width[, channels]), mode),
+        where mode is one of border_formats.NATIVE_MODES, or 'deep' for a
+        16-bit RGB(A) frame read in RGB(A) order
+    """
+    if os.path.splitext(image_path)[1].lower() in RAW_EXTENSIONS and raw_size:
+        width, height = raw_size
+        data = np.fromfile(image_path, dtype=np.uint8, count=raw_layout(width, height)['stride'] * height)
+        return data.reshape(height, width, 3), 'RGB'
+
+    img = Image.open(image_path)
+    if is_deep_rgb(img):
+        frame = read_deep_frame(image_path)
+        if frame is not None:
+            return frame[..., [*DEEP_CHANNELS, *range(3, frame.shape[2])]], 'deep'
+
+    img = native_mode(img)
+    return np.asarray(img), img.mode
+
+def verify_frame_border(image_path, pixels, raw_size=None, tolerance=0, max_examples=5):
+    """
+    Compares the border of a rendered frame with its expected pixels.
+
+    The frame's whole perimeter is gathered with one index into the
+    flattened pixels (using the cached geometry of its size) and compared
+    against every expected color at once.
+
+    Args:
+        image_path: Path to the rendered frame
+        pixels: PIXEL_DTYPE structured array of the frame's border data
+        raw_size: (width, height) of headerless .rgb/.raw frames
+        tolerance: Largest per-channel difference still counted as a match
+                   (in 8-bit steps; e.g. for lossy outputs)
+        max_examples: Mismatching pixels to report in detail
+
+    Returns:
+        Tuple of (pixels checked, pixels mismatched, examples), where the
+        examples are (x, y, expected, actual) tuples
+    """
+    frame, mode = read_frame_colors(image_path, raw_size)
+    height, width = frame.shape[:2]
+    geometry = border_geometry(width, height)
+    valid, _ = geometry.select(as_pixel_array(pixels))
+
+    # One gather pulls the perimeter; expected pixels index into it
+    perimeter = frame.reshape(height * width, -1)[geometry.flat]
+    actual = perimeter[geometry.positions(valid['x'], valid['y'])].astype(np.int64)
+
+    if mode == 'deep':
+        expected = np.column_stack((valid['r'], valid['g'], valid['b'])).astype(np.int64) * DEEP_SCALE
+        scale = DEEP_SCALE
+    else:
+        expected = native_colors(mode, valid['r'], valid['g'], valid['b'])
+        scale = NATIVE_MODES[mode][2]
+    actual = actual[:, :expected.shape[1]]
+
+    bad = np.flatnonzero(np.abs(actual - expected).max(axis=1, initial=0) > tolerance * scale)
+    examples = [(int(valid['x'][i]), int(valid['y'][i]), tuple(expected[i].tolist()),
+                 tuple(actual[i].tolist())) for i in bad[:max_examples]]
+    return len(valid), len(bad), examples
+
+def verify_single_frame(args):
+    """
+    Pool worker for verify_image_sequence.
+
+    Args:
+        args: Tuple of (image_path, frame_num, start, stop) into the mapped cache
+
+    Returns:
+        Tuple of (frame_num, image_path, checked, mismatched, examples, error),
+        where error is a message if the frame could not be read
+    """
+    image_path, frame_num, start, stop = args
+    try:
+        checked, mismatched, examples = verify_frame_border(
+            image_path, _worker_pixels[start:stop], **_worker_options)
+    except Exception as e:
+        return (frame_num, image_path, 0, 0, [], f"{type(e).__name__}: {e}")
+    return (frame_num, image_path, checked, mismatched, examples, None)
+
+def verify_image_sequence(output_pattern, xml_path, num_workers=None, backend='auto',
+                          raw_size=None, tolerance=0, chunk_size=4, cache_listing=False,
+                          max_reported=20):
+    """
+    Verifies that a rendered sequence matches its border XML.
+
+    Every output frame is decoded in parallel and its perimeter compared in
+    bulk against the frame's pixels from the compiled border cache.
+
+    Args:
+        output_pattern: Pattern for the rendered frames (e.g.
+                        "output_frames/frame_####.png", see border_sequence)
+        xml_path: Path to XML file with sequence border data
+        num_workers: Number of parallel workers (None = auto-detect CPUs)
+        backend: 'sequential', 'thread', 'process' or 'auto'
+        raw_size: (width, height) of headerless .rgb/.raw frames
+        tolerance: Largest per-channel difference still counted as a match
+                   (0 = exact; raise it for lossy formats such as JPEG)
+        chunk_size: Frames handed to a worker per task
+        cache_listing: Reuse the directory listing of an earlier run
+        max_reported: Mismatching or unreadable frames listed in detail
+
+    Returns:
+        Dictionary with frames_checked, frames_ok, pixels_checked,
+        pixels_mismatched, mismatched (frame number -> (count, examples)),
+        unreadable (frame number -> error), no_data (frame numbers without
+        border data) and missing_outputs (border frames without an output)
+    """
+    start_time = time.time()
+
+    sequence = discover_sequence(output_pattern, cache_listing)
+    frames = sequence['frames']
+    print(f"Found {len(frames)} frames to verify")
+
+    cache = load_pixel_cache(xml_path)
+    frame_positions = cache.index()
+
+    if num_workers is None:
+        num_workers = cpu_count()
+    backend, reason = resolve_backend(backend, False, num_workers)
+    print(f"Verifying with {num_workers} worker(s) on the {backend} backend ({reason})")
+
+    # Jobs for the frames that have border data; the rest are reported
+    no_data = [frame_num for frame_num, _ in frames if frame_num not in frame_positions]
+    jobs = [(path, frame_num, int(cache.offsets[frame_positions[frame_num]]),
+             int(cache.offsets[frame_positions[frame_num] + 1]))
+            for frame_num, path in frames if frame_num in frame_positions]
+    found = {frame_num for frame_num, _ in frames}
+    missing_outputs = sorted(frame_num for frame_num in frame_positions if frame_num not in found)
+
+    report = {
+        'frames_checked': 0, 'frames_ok': 0, 'pixels_checked': 0, 'pixels_mismatched': 0,
+        'mismatched': {}, 'unreadable': {}, 'no_data': no_data, 'missing_outputs': missing_outputs,
+    }
 
-os.makedirs(output_dir, exist_ok=True)
-image_files = sorted(glob.glob(input_pattern))
+    options = {'raw_size': raw_size, 'tolerance': tolerance}
+    with create_pool(backend, num_workers, initializer=init_worker,
+                     initargs=(cache.path, options)) as pool:
+        try:
+            for frame_num, path, checked, mismatched, examples, error in pool.imap_unordered(
+                    verify_single_frame, jobs, chunksize=chunk_size):
+                report['frames_checked'] += 1
+                if error is not None:
+                    report['unreadable'][frame_num] = error
+                    continue
+                report['pixels_checked'] += checked
+                report['pixels_mismatched'] += mismatched
+                if mismatched:
+                    report['mismatched'][frame_num] = (mismatched, examples)
+                else:
+                    report['frames_ok'] += 1
+
+                if report['frames_checked'] % 100 == 0:
+                    print(f"\rVerified {report['frames_checked']}/{len(jobs)} frames", end='', flush=True)
+        finally:
+            pool.close()
+            pool.join()
+
+    elapsed = max(time.time() - start_time, 1e-9)
+    print(f"\n{'='*60}")
+    print(f"Verification {'passed' if is_verified(report) else 'FAILED'}")
+    print(f"{'='*60}")
+    print(f"Frames checked: {report['frames_checked']}, matching: {report['frames_ok']}, "
+          f"mismatching: {len(report['mismatched'])}, unreadable: {len(report['unreadable'])}")
+    print(f"Border pixels checked: {report['pixels_checked']}, "
+          f"mismatched: {report['pixels_mismatched']}")
+    print(f"Total time: {elapsed:.2f} seconds ({report['frames_checked']/elapsed:.1f} frames/s)")
+
+    for frame_num in sorted(report['mismatched'])[:max_reported]:
+        count, examples = report['mismatched'][frame_num]
+        details = ', '.join(f"({x},{y}) expected {exp} got {act}" for x, y, exp, act in examples)
+        print(f"  - Frame {frame_num}: {count} pixel(s) differ, e.g. {details}")
+    for frame_num in sorted(report['unreadable'])[:max_reported]:
+        print(f"  - Frame {frame_num}: {report['unreadable'][frame_num]}")
+    if no_data:
+        print(f"Warning: {len(no_data)} frame(s) have no border data in the XML")
+    if missing_outputs:
+        print(f"Warning: {len(missing_outputs)} frame(s) of the XML have no output "
+              f"(first: {missing_outputs[:5]})")
+
+    return report
+
+def is_verified(report):
+    """
+    Tells whether a verify_image_sequence report is clean.
+
+    Args:
+        report: Result of verify_image_sequence
+
+    Returns:
+        True if every frame was readable and matched its border data
+    """
+    return not report['mismatched'] and not report['unreadable']
 
-if not image_files:
-    print(f"No images found matching pattern: {input_pattern}")
-    return
+def process_image_sequence_standard(input_pattern, xml_path, output_dir):
+    """
+    Standard processing without optimization (for comparison).
+
+    Args:
+        input_pattern: Pattern for input images
+        xml_path: Path to XML file
+        output_dir: Directory to save output images
+    """
+    start_time = time.time()
+
+    os.makedirs(output_dir, exist_ok=True)
+    sequence = discover_sequence(input_pattern)
+    frames = sequence['frames']
+
+    if not frames:
+        print(f"No images found matching pattern: {input_pattern}")
+        return
+
+    print(f"Found {len(frames)} images to process")
+    print_sequence_report(sequence)
+    print(f"Using standard PIL pixel access (no optimization)")
+
+    # Index frames by number in one pass over the XML
+    frame_index = build_frame_index(xml_path)
+
+    total_pixels = 0
+
+    for frame_num, img_path in frames:
+        basename = os.path.basename(img_path)
+
+        # Open image with standard PIL
+        img = Image.open(img_path)
+        img = img.convert('RGB')
+        width, height = img.size
+        pixels = img.load()
+
+        # Find frame data
+        frame_pixels = frame_index.get(frame_num)
+        if frame_pixels is None:
+            continue
+
+        # Apply pixels using PIL (slower)
+        for x, y, r, g, b in frame_pixels:
+            is_border = (x == 0 or x == width - 1 or 
+                        y == 0 or y == height - 1)
+
+            if 0 <= x < width and 0 <= y < height and is_border:
+                pixels[x, y] = (r, g, b)
+                total_pixels += 1
+
+        output_path = os.path.join(output_dir, basename)
+        img.save(output_path)
+
+    total_time = time.time() - start_time
+
+    print(f"\n{'='*60}")
+    print(f"Standard processing complete!")
+    print(f"{'='*60}")
+    print(f"Total frames processed: {len(frames)}")
+    print(f"Total border pixels set: {total_pixels}")
+    print(f"Total time: {total_time:.2f} seconds")
+    print(f"Average time per frame: {total_time/len(frames):.3f} seconds")
+    print(f"Frames per second: {len(frames)/total_time:.2f}")
 
-print(f"Found {len(image_files)} images to process")
-print(f"Using standard PIL pixel access (no optimization)")
+def create_sequence_xml(xml_path, num_frames=10, width=200, height=150):
+    """
+    Creates an example XML file for an image sequence.
+    """
+    root = ET.Element('image_sequence')
 
-tree = ET.parse(xml_path)
-root = tree.getroot()
+    for frame_num in range(num_frames):
+        frame_elem = ET.SubElement(root, 'frame', number=str(frame_num))
 
-total_pixels = 0
+        red_val = int(255 * (frame_num / num_frames))
+        blue_val = 255 - red_val
 
-for img_path in image_files:
-    basename = os.path.basename(img_path)
-    filename_no_ext = os.path.splitext(basename)[0]
-    
-    try:
-        frame_num = int(''.join(filter(str.isdigit, filename_no_ext)))
-    except ValueError:
-        frame_num = image_files.index(img_path)
-    
-    # Open image with standard PIL
-    img = Image.open(img_path)
-    img = img.convert('RGB')
-    width, height = img.size
-    pixels = img.load()
-    
-    # Find frame data
-    frame_elem = root.find(f".//frame[@number='{frame_num}']")
-    if frame_elem is None:
-        continue
-    
-    # Apply pixels using PIL (slower)
-    for pixel_elem in frame_elem.findall('pixel'):
-        x = int(pixel_elem.get('x'))
-        y = int(pixel_elem.get('y'))
-        r = int(pixel_elem.get('r'))
-        g = int(pixel_elem.get('g'))
-        b = int(pixel_elem.get('b'))
-        
-        is_border = (x == 0 or x == width - 1 or 
-                    y == 0 or y == height - 1)
-        
-        if 0 <= x < width and 0 <= y < height and is_border:
-            pixels[x, y] = (r, g, b)
-            total_pixels += 1
-    
-    output_path = os.path.join(output_dir, basename)
-    img.save(output_path)
-
-total_time = time.time() - start_time
-
-print(f"\n{'='*60}")
-print(f"Standard processing complete!")
-print(f"{'='*60}")
-print(f"Total frames processed: {len(image_files)}")
-print(f"Total border pixels set: {total_pixels}")
-print(f"Total time: {total_time:.2f} seconds")
-print(f"Average time per frame: {total_time/len(image_files):.3f} seconds")
-print(f"Frames per second: {len(image_files)/total_time:.2f}")
-```
+        # Add border pixels
+        ET.SubElement(frame_elem, 'pixel', 
+                     x='0', y='0', 
+                     r=str(red_val), g='0', b=str(blue_val))
 
-def create_sequence_xml(xml_path, num_frames=10, width=200, height=150):
-“””
-Creates an example XML file for an image sequence.
-“””
-root = ET.Element(‘image_sequence’)
-
-```
-for frame_num in range(num_frames):
-    frame_elem = ET.SubElement(root, 'frame', number=str(frame_num))
-    
-    red_val = int(255 * (frame_num / num_frames))
-    blue_val = 255 - red_val
-    
-    # Add border pixels
-    ET.SubElement(frame_elem, 'pixel', 
-                 x='0', y='0', 
-                 r=str(red_val), g='0', b=str(blue_val))
-    
-    ET.SubElement(frame_elem, 'pixel', 
-                 x=str(width-1), y='0', 
-                 r=str(blue_val), g=str(red_val), b='0')
-    
-    # Add strip along top border
-    for x in range(0, width, 5):
-        color_offset = (x + frame_num * 10) % 255
         ET.SubElement(frame_elem, 'pixel', 
-                     x=str(x), y='0', 
-                     r=str(color_offset), g=str(255-color_offset), b='128')
+                     x=str(width-1), y='0', 
+                     r=str(blue_val), g=str(red_val), b='0')
+
+        # Add strip along top border
+        for x in range(0, width, 5):
+            color_offset = (x + frame_num * 10) % 255
+            ET.SubElement(frame_elem, 'pixel', 
+                         x=str(x), y='0', 
+                         r=str(color_offset), g=str(255-color_offset), b='128')
 
-tree = ET.ElementTree(root)
-ET.indent(tree, space='  ')
-tree.write(xml_path, encoding='utf-8', xml_declaration=True)
-print(f"Example XML created at {xml_path}")
-```
+    tree = ET.ElementTree(root)
+    ET.indent(tree, space='  ')
+    tree.write(xml_path, encoding='utf-8', xml_declaration=True)
+    print(f"Example XML created at {xml_path}")
 
 # Example usage
 
-if **name** == “**main**”:
-# Create example XML
-create_sequence_xml(“sequence_borders.xml”, num_frames=10, width=200, height=150)
-
-```
-print("\n" + "="*60)
-print("OPTIMIZED VERSION (numpy + multiprocessing)")
-print("="*60)
-
-# Process with optimization
-process_image_sequence_optimized(
-    input_pattern="input_frames/frame_*.jpg",
-    xml_path="sequence_borders.xml",
-    output_dir="output_frames_optimized"
-)
-
-# Uncomment to compare with standard version:
-# print("\n" + "="*60)
-# print("STANDARD VERSION (for comparison)")
-# print("="*60)
-# process_image_sequence_standard(
-#     input_pattern="input_frames/frame_*.jpg",
-#     xml_path="sequence_borders.xml",
-#     output_dir="output_frames_standard"
-# )
-```
\ No newline at end of file
+if __name__ == "__main__":
+    # Create example XML
+    create_sequence_xml("sequence_borders.xml", num_frames=10, width=200, height=150)
+
+    print("\n" + "="*60)
+    print("OPTIMIZED VERSION (numpy + multiprocessing)")
+    print("="*60)
+
+    # Process with optimization
+    process_image_sequence_optimized(
+        input_pattern="input_frames/frame_*.jpg",
+        xml_path="sequence_borders.xml",
+        output_dir="output_frames_optimized"
+    )
+
+    # Uncomment to compare with standard version:
+    # print("\n" + "="*60)
+    # print("STANDARD VERSION (for comparison)")
+    # print("="*60)
+    # process_image_sequence_standard(
+    #     input_pattern="input_frames/frame_*.jpg",
+    #     xml_path="sequence_borders.xml",
+    #     output_dir="output_frames_standard"
+    # )
@@ -0,0 +1,53 @@
+"""
+Tests for border_sequence: sequence discovery must never let one match
+span two names of the newline-joined directory listing.
+"""
+
+import os
+
+import pytest
+
+from border_sequence import compile_sequence_pattern, discover_sequence
+
+NAMES = ('frame_0001.png', 'frame_0002.png', 'frame_0003.exr', 'notes.png')
+
+@pytest.fixture
+def sequence_dir(tmp_path):
+    for name in NAMES:
+        (tmp_path / name).write_bytes(b'')
+    return tmp_path
+
+def frames(directory, name_pattern):
+    found = discover_sequence(os.path.join(str(directory), name_pattern))['frames']
+    return [(frame_num, os.path.basename(path)) for frame_num, path in found]
+
+def test_wildcard_skips_non_matching_neighbours(sequence_dir):
+    assert frames(sequence_dir, 'frame_*.png') == [(1, 'frame_0001.png'), (2, 'frame_0002.png')]
+
+def test_every_path_exists(sequence_dir):
+    for pattern in ('frame_*.png', 'frame_####.png', 'frame_%04d.png', '*.png', 'frame_[!x]*'):
+        for _, path in discover_sequence(os.path.join(str(sequence_dir), pattern))['frames']:
+            assert os.path.isfile(path)
+
+@pytest.mark.parametrize('pattern, listing', [
+    ('frame_*.png', 'frame_0001.png\nnotes.png'),
+    ('frame_*.png', 'frame_\nnotes.png'),
+    ('frame_[!a]*.png', 'frame_\nb.png'),
+    ('frame_[!a]###.png', 'frame_\n001.png'),
+])
+def test_match_never_spans_names(pattern, listing):
+    names = listing.split('\n')
+    for match in compile_sequence_pattern(pattern).finditer(listing):
+        assert match.group('name') in names
+
+def test_directory_wildcard_scans_every_match(tmp_path):
+    for shot, frame_num in (('shot010', 1), ('shot020', 2)):
+        (tmp_path / shot).mkdir()
+        (tmp_path / shot / f'frame_{frame_num:04d}.png').write_bytes(b'')
+        (tmp_path / shot / 'notes.png').write_bytes(b'')
+    (tmp_path / 'shot030.png').write_bytes(b'')
+
+    found = discover_sequence(os.path.join(str(tmp_path), 'shot*', 'frame_*.png'))['frames']
+    assert [(frame_num, os.path.relpath(path, str(tmp_path))) for frame_num, path in found] == [
+        (1, os.path.join('shot010', 'frame_0001.png')),
+        (2, os.path.join('shot020', 'frame_0002.png'))]
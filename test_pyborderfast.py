@@ -0,0 +1,24 @@
+"""
+Tests for pyborderfast: errors from the staged pipeline must name the frame.
+"""
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from pyborderfast import create_sequence_xml, process_image_sequence_optimized
+
+@pytest.mark.parametrize('backend', ['sequential', 'thread', 'process'])
+def test_prefetched_frame_error_names_the_file(tmp_path, backend):
+    frames = tmp_path / 'in'
+    frames.mkdir()
+    for frame_num in range(3):
+        Image.fromarray(np.zeros((20, 30, 3), dtype=np.uint8)).save(frames / f'frame_{frame_num:04d}.png')
+    (frames / 'frame_0001.png').write_bytes(b'not an image')
+    xml_path = tmp_path / 'borders.xml'
+    create_sequence_xml(str(xml_path), 3, 30, 20)
+
+    with pytest.raises(RuntimeError, match=r'Frame 1 \(.*frame_0001\.png\)'):
+        process_image_sequence_optimized(str(frames / 'frame_####.png'), str(xml_path),
+                                         str(tmp_path / 'out'), num_workers=2,
+                                         backend=backend, io_threads=1)